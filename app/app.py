@@ -1,7 +1,13 @@
 # app.py
-from flask import Flask, redirect, url_for, session, flash
-from models.db import init_db
+from flask import Flask, redirect, url_for, session, flash, request, g, make_response
+from models.db import init_db, commit_request_connection, close_request_connection, add_server_timing
 from models.users import get_credits
+from models.reviews import rebuild_consultant_ratings
+from models.chat import listen_chat_invalidate
+from models.pages import listen_page_invalidate
+from models.users import listen_credits_invalidate
+from models.ratelimit import limiters, admission, ROUTE_CLASSES, UNLIMITED_ENDPOINTS
+import math
 from controllers.faq import faq_bp
 from controllers.view_users import view_users_bp
 from controllers.chat import chat_bp
@@ -12,6 +18,7 @@ from controllers.register import register_bp
 from controllers.requests import requests_bp
 from controllers.timetables import timetables_bp
 from controllers.register_consultant import register_consultant_bp
+from controllers.stats import stats_bp
 import secrets
 import os
 
@@ -28,11 +35,64 @@ app.register_blueprint(register_bp)
 app.register_blueprint(requests_bp)
 app.register_blueprint(timetables_bp)
 app.register_blueprint(register_consultant_bp)
+app.register_blueprint(stats_bp)
+
+# after_request hooks run in reverse order, the commit is timed too
+app.after_request(add_server_timing)
+app.after_request(commit_request_connection)
+app.teardown_appcontext(close_request_connection)
+
+# endpoints that never render the navbar, no need to refresh credits
+NO_CREDITS_ENDPOINTS = {
+    'static',
+    'chat.send_message',
+    'chat.poll_chat',
+    'chat.stream_chat',
+    'chat.check_active',
+    'chat.sync_chat',
+    'stats.stats',
+}
+
+def too_busy(status, retry_after):
+    response = make_response("Too many requests, please retry shortly.\n", status)
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+# registered before ensure_default_session so shed requests cost no query
+@app.before_request
+def admit_request():
+    if request.endpoint in UNLIMITED_ENDPOINTS:
+        return
+
+    route_class = ROUTE_CLASSES.get(request.endpoint, 'default')
+    client = session.get('user_id') or request.remote_addr
+    wait = limiters[route_class].hit(hash((route_class, client)))
+    if wait:
+        return too_busy(429, wait)
+
+    if not admission.acquire():
+        return too_busy(503, 1)
+    g.admitted = True
+
+@app.teardown_request
+def release_admission(exc=None):
+    if g.pop('admitted', False):
+        admission.release()
+
+# on a worker's first request, before anything is cached; the pid check
+# makes later calls cheap and covers workers forked after import
+@app.before_request
+def start_listeners():
+    listen_chat_invalidate()
+    listen_page_invalidate()
+    listen_credits_invalidate()
 
 @app.before_request
 def ensure_default_session():
     if 'role' not in session:
         session['role'] = 'guest'
+    if request.endpoint in NO_CREDITS_ENDPOINTS:
+        return
     if session['role'] == 'user':
         session['credits'] = get_credits(session['username'])
 
@@ -40,6 +100,14 @@ def ensure_default_session():
 def index():
     return redirect(url_for('timetables.timetables'))
 
+@app.cli.command('rebuild-ratings')
+def rebuild_ratings():
+    """Recompute the consultant rating totals from the reviews table."""
+    rebuilt = rebuild_consultant_ratings()
+    if isinstance(rebuilt, str):
+        raise SystemExit(rebuilt)
+    print(f"Rebuilt ratings for {rebuilt} consultants.")
+
 if __name__ == '__main__':
     init_db()
     app.run(debug=True, host=os.getenv('FALSK_HOST', '0.0.0.0'), port=os.getenv('FALSK_PORT', '5000'))
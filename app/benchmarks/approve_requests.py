@@ -0,0 +1,146 @@
+"""
+Approving a large backlog of credit requests.
+
+Compares the previous approve-all (one aggregate credit over the whole
+requests table, then DELETE FROM requests, in one transaction) with the
+batched approve_requests(). Reports total time and the longest single
+transaction, which is how long balance rows stay locked. Run from the
+app directory:
+
+    python -m benchmarks.approve_requests --requests 1000000 --users 10000
+"""
+import time
+
+from models.requests import approve_requests
+from benchmarks.common import bench_connection, connect, drop_schema, parser
+
+SCHEMA = "bench_approve"
+
+
+def seed(cur, users):
+    cur.execute("""
+        CREATE TABLE users (
+            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            username VARCHAR(30) UNIQUE NOT NULL
+        );
+        CREATE TABLE requests (
+            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            amount INT NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT now(),
+            user_id INT NOT NULL REFERENCES users(id)
+        );
+        CREATE INDEX ON requests(user_id);
+        CREATE TABLE credit_ledger (
+            id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            user_id INT NOT NULL REFERENCES users(id),
+            delta INT NOT NULL,
+            reason TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        CREATE TABLE credit_balances (
+            user_id INT PRIMARY KEY REFERENCES users(id),
+            balance INT NOT NULL DEFAULT 0 CHECK (balance >= 0)
+        );
+        CREATE FUNCTION apply_credit_entry() RETURNS trigger AS $$
+        BEGIN
+            UPDATE credit_balances SET balance = balance + NEW.delta
+            WHERE user_id = NEW.user_id;
+            IF NOT FOUND THEN
+                INSERT INTO credit_balances (user_id) VALUES (NEW.user_id)
+                ON CONFLICT (user_id) DO NOTHING;
+                UPDATE credit_balances SET balance = balance + NEW.delta
+                WHERE user_id = NEW.user_id;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        CREATE TRIGGER credit_ledger_apply AFTER INSERT ON credit_ledger
+        FOR EACH ROW EXECUTE FUNCTION apply_credit_entry();
+    """)
+    cur.execute("""
+        INSERT INTO users (username)
+        SELECT 'user' || i FROM generate_series(1, %s) i
+    """, (users,))
+
+
+def reset(cur, requests, users):
+    cur.execute("TRUNCATE requests, credit_ledger, credit_balances")
+    cur.execute("""
+        INSERT INTO requests (amount, user_id)
+        SELECT 1 + i %% 100, 1 + i %% %s FROM generate_series(1, %s) i
+    """, (users, requests))
+    cur.execute("ANALYZE")
+
+
+def approve_single(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO credit_ledger (user_id, delta, reason)
+            SELECT user_id, SUM(amount), 'request'
+            FROM requests
+            GROUP BY user_id
+        """)
+        cur.execute("DELETE FROM requests")
+    conn.commit()
+
+
+def run(label, approve, conn, cur, requests):
+    start = time.perf_counter()
+    longest = approve(conn)
+    elapsed = time.perf_counter() - start
+
+    cur.execute("SELECT count(*), coalesce(SUM(balance), 0) FROM credit_balances")
+    users, credits = cur.fetchone()
+    print(
+        f"{label:<12} {requests / elapsed:>10.0f} requests/s  total {elapsed:>7.2f} s"
+        f"  longest transaction {longest * 1000:>9.1f} ms"
+        f"  credited {credits} to {users} users"
+    )
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--requests", type=int, default=1000000)
+    p.add_argument("--users", type=int, default=10000)
+    p.add_argument("--batch-size", type=int, default=5000)
+    args = p.parse_args()
+
+    conn = bench_connection(SCHEMA)
+    cur = conn.cursor()
+    approver = connect(SCHEMA)
+    approver.autocommit = False
+    try:
+        seed(cur, args.users)
+
+        def single(c):
+            start = time.perf_counter()
+            approve_single(c)
+            return time.perf_counter() - start
+
+        def batched(c):
+            longest = 0.0
+            last = time.perf_counter()
+
+            def progress(totals):
+                nonlocal longest, last
+                now = time.perf_counter()
+                longest = max(longest, now - last)
+                last = now
+
+            approve_requests(c, args.batch_size, progress)
+            return longest
+
+        for label, approve in (("single", single), ("batched", batched)):
+            reset(cur, args.requests, args.users)
+            run(label, approve, approver, cur, args.requests)
+
+    finally:
+        cur.close()
+        approver.close()
+        if not args.keep:
+            drop_schema(conn, SCHEMA)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
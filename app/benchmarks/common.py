@@ -0,0 +1,89 @@
+import argparse
+import re
+import statistics
+import time
+
+import psycopg2
+
+from models.db import db_params, PooledConnection
+from models.migrations import get_migrations, split_statements
+
+# statements of app/migrations that reach past the schema
+_database_wide = re.compile(r"""
+      ^CREATE\ SCHEMA\ IF\ NOT\ EXISTS\ \w+;$
+    | ^ALTER\ DATABASE\ [^;]*;$
+    | ^SET\ search_path\ TO\ [^;]*;$
+    | ^CREATE\ EXTENSION\ IF\ NOT\ EXISTS\ pg_cron;$
+    | ^SELECT\ cron\.(?:[^\n]*;$|.*?^\);$)
+""", re.M | re.S | re.X)
+
+
+def bench_connection(schema):
+    """
+    Autocommit connection whose search_path points at a scratch schema,
+    so benchmarks never touch the application's data.
+    """
+    conn = psycopg2.connect(connection_factory=PooledConnection, **db_params)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"SET search_path TO {schema}, public")
+    return conn
+
+
+def connect(schema):
+    """Extra autocommit connection into a scratch schema, e.g. one per thread."""
+    conn = psycopg2.connect(connection_factory=PooledConnection, options=f"-c search_path={schema},public", **db_params)
+    conn.autocommit = True
+    return conn
+
+
+def migrate_schema(conn):
+    """
+    Build the tables, triggers and functions of the application in the
+    scratch schema of conn from app/migrations, so benchmarks measure the
+    real DDL. What reaches past the schema is left out: the database's
+    default search_path and the pg_cron jobs.
+    """
+    with conn.cursor() as cur:
+        for version, name, path in get_migrations():
+            with open(path) as f:
+                sql = _database_wide.sub("", f.read())
+            if sql.startswith('-- no-transaction'):
+                for statement in split_statements(sql):
+                    cur.execute(statement)
+            else:
+                cur.execute(sql)
+
+
+def drop_schema(conn, schema):
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+
+
+def timed(fn, iterations):
+    """Call fn(i) iterations times and return per-call latencies in seconds."""
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(label, latencies):
+    total = sum(latencies)
+    ordered = sorted(latencies)
+    p95 = ordered[int(len(ordered) * 0.95) - 1] if ordered else 0.0
+    print(
+        f"{label:<32} {len(latencies) / total if total else 0:>10.0f} ops/s"
+        f"  mean {statistics.mean(latencies) * 1000:>7.3f} ms"
+        f"  p95 {p95 * 1000:>7.3f} ms"
+    )
+
+
+def parser(description):
+    p = argparse.ArgumentParser(description=description)
+    p.add_argument("--keep", action="store_true", help="keep the scratch schema afterwards")
+    return p
@@ -0,0 +1,124 @@
+"""
+Login bursts next to chat polling.
+
+A set of threads logs in back to back (bcrypt check at BCRYPT_ROUNDS)
+while other threads run the chat poll query, as request threads of one
+worker would. Compares bcrypt inline on the request threads with the
+HashPool from models.auth and reports login throughput, rejected logins
+and poll latency. Run from the app directory:
+
+    python -m benchmarks.login_load --logins 8 --polls 8 --seconds 10
+"""
+import statistics
+import threading
+import time
+
+import bcrypt
+
+from models.auth import BCRYPT_ROUNDS, HashBusy, check_password, get_hash_pool
+from models.messages import MESSAGE_CURSOR
+from models.db import run_statement
+from benchmarks.common import bench_connection, connect, drop_schema, parser
+
+SCHEMA = "bench_login"
+
+
+def seed(cur, chats, messages):
+    cur.execute("""
+        CREATE TABLE messages (
+            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            message TEXT NOT NULL,
+            sent_at TIMESTAMPTZ DEFAULT now(),
+            chat_id INT NOT NULL
+        );
+        CREATE INDEX ON messages(chat_id, id);
+    """)
+    cur.execute("""
+        INSERT INTO messages (message, chat_id)
+        SELECT 'message ' || m, c
+        FROM generate_series(1, %s) c, generate_series(1, %s) m
+    """, (chats, messages))
+    cur.execute("ANALYZE")
+
+
+def check_inline(password, hashed):
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8')), None
+
+
+def run(label, check, args, hashed):
+    stop = threading.Event()
+    logins = [0] * args.logins
+    rejected = [0] * args.logins
+    latencies = [[] for _ in range(args.polls)]
+
+    def login_worker(n):
+        while not stop.is_set():
+            try:
+                check("password", hashed)
+                logins[n] += 1
+            except HashBusy:
+                rejected[n] += 1
+                time.sleep(0.01)
+
+    def poll_worker(n):
+        conn = connect(SCHEMA)
+        cur = conn.cursor()
+        chat_id = 1
+        while not stop.is_set():
+            start = time.perf_counter()
+            run_statement(cur, MESSAGE_CURSOR, (chat_id,))
+            cur.fetchall()
+            latencies[n].append(time.perf_counter() - start)
+            chat_id = chat_id % args.chats + 1
+            time.sleep(args.poll_interval)
+        cur.close()
+        conn.close()
+
+    threads = [threading.Thread(target=login_worker, args=(n,)) for n in range(args.logins)]
+    threads += [threading.Thread(target=poll_worker, args=(n,)) for n in range(args.polls)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    polls = sorted(l for per_thread in latencies for l in per_thread)
+    p99 = polls[int(len(polls) * 0.99) - 1] if polls else 0.0
+    print(
+        f"{label:<8} {sum(logins) / args.seconds:>7.1f} logins/s  rejected {sum(rejected):>6}"
+        f"  poll p50 {statistics.median(polls) * 1000 if polls else 0:>7.2f} ms"
+        f"  p99 {p99 * 1000:>8.2f} ms"
+    )
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--logins", type=int, default=8, help="threads logging in")
+    p.add_argument("--polls", type=int, default=8, help="threads polling chats")
+    p.add_argument("--poll-interval", type=float, default=0.01)
+    p.add_argument("--chats", type=int, default=1000)
+    p.add_argument("--seconds", type=float, default=10)
+    args = p.parse_args()
+
+    hashed = bcrypt.hashpw(b"password", bcrypt.gensalt(BCRYPT_ROUNDS)).decode('utf-8')
+
+    conn = bench_connection(SCHEMA)
+    cur = conn.cursor()
+    try:
+        seed(cur, args.chats, 20)
+        # start the workers before measuring
+        get_hash_pool().run(bcrypt.gensalt)
+
+        for label, check in (("inline", check_inline), ("pool", check_password)):
+            run(label, check, args, hashed)
+
+    finally:
+        cur.close()
+        if not args.keep:
+            drop_schema(conn, SCHEMA)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
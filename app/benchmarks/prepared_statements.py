@@ -0,0 +1,110 @@
+"""
+Plain vs. prepared execution of the hot chat and session queries.
+
+Seeds a scratch schema and runs the application's PreparedStatements
+next to the same SQL sent as plain queries. Run from the app directory:
+
+    python -m benchmarks.prepared_statements --chats 1000 --messages 50
+"""
+import random
+import re
+
+from models.db import run_statement
+from models.chat import CHAT_MEMBERS
+from models.messages import MESSAGES_AFTER
+from models.users import USER_CREDITS
+from benchmarks.common import bench_connection, drop_schema, timed, report, parser
+
+SCHEMA = "bench_prepared"
+
+
+def seed(cur, chats, messages):
+    cur.execute("""
+        CREATE TABLE users (
+            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            username VARCHAR(30) UNIQUE NOT NULL
+        );
+        CREATE TABLE credit_balances (
+            user_id INT PRIMARY KEY REFERENCES users(id),
+            balance INT NOT NULL DEFAULT 0
+        );
+        CREATE TABLE chat (
+            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            user_id INT NOT NULL REFERENCES users(id),
+            consultant_id INT NOT NULL REFERENCES users(id)
+        );
+        CREATE TABLE messages (
+            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+            sender_id INT NOT NULL REFERENCES users(id),
+            message TEXT NOT NULL,
+            sent_at TIMESTAMPTZ DEFAULT now(),
+            chat_id INT NOT NULL REFERENCES chat(id)
+        );
+        CREATE INDEX ON messages(chat_id);
+    """)
+    cur.execute("""
+        INSERT INTO users (username)
+        SELECT 'user' || i FROM generate_series(1, %s) i
+    """, (chats * 2,))
+    cur.execute("INSERT INTO credit_balances (user_id, balance) SELECT id, 1000 FROM users")
+    cur.execute("""
+        INSERT INTO chat (user_id, consultant_id)
+        SELECT i, %s + i FROM generate_series(1, %s) i
+    """, (chats, chats))
+    cur.execute("""
+        INSERT INTO messages (sender_id, message, chat_id)
+        SELECT c.user_id, 'message ' || m, c.id
+        FROM chat c, generate_series(1, %s) m
+    """, (messages,))
+    cur.execute("ANALYZE")
+
+
+def plain(statement):
+    return re.sub(r"\$\d+", "%s", statement.query)
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--chats", type=int, default=1000)
+    p.add_argument("--messages", type=int, default=50)
+    p.add_argument("--iterations", type=int, default=20000)
+    args = p.parse_args()
+
+    conn = bench_connection(SCHEMA)
+    cur = conn.cursor()
+    try:
+        seed(cur, args.chats, args.messages)
+        last_id = args.chats * args.messages
+
+        cases = {
+            "chat membership": (CHAT_MEMBERS, lambda i: (random.randint(1, args.chats),)),
+            "messages after id": (MESSAGES_AFTER, lambda i: (1, random.randint(1, args.chats), last_id - 10)),
+            "user credits": (USER_CREDITS, lambda i: (f"user{random.randint(1, args.chats)}",)),
+        }
+
+        for label, (statement, values) in cases.items():
+            sql = plain(statement)
+
+            def run_plain(i):
+                cur.execute(sql, values(i))
+                cur.fetchall()
+
+            def run_prepared(i):
+                run_statement(cur, statement, values(i))
+                cur.fetchall()
+
+            # warm both paths so the first PREPARE is not measured
+            run_plain(0)
+            run_prepared(0)
+            report(f"{label} (plain)", timed(run_plain, args.iterations))
+            report(f"{label} (prepared)", timed(run_prepared, args.iterations))
+
+    finally:
+        cur.close()
+        if not args.keep:
+            drop_schema(conn, SCHEMA)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
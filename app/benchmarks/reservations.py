@@ -0,0 +1,150 @@
+"""
+Concurrent slot booking: N threads race for the same slots.
+
+Compares a lock-based reservation (SELECT ... FOR UPDATE on the
+consultant and the balance, then the booking and ledger inserts, commit)
+with the single RESERVE_SLOT statement. Every thread has its own user and connection
+and walks the same list of slots, so almost every attempt collides.
+Run from the app directory:
+
+    python -m benchmarks.reservations --threads 32 --consultants 20
+"""
+import threading
+import time
+
+import psycopg2
+
+from models.users import RESERVE_SLOT
+from benchmarks.common import bench_connection, connect, drop_schema, migrate_schema, parser
+
+SCHEMA = "bench_reservations"
+BALANCE = 1000000
+
+
+def seed(cur, consultants, users):
+    migrate_schema(cur.connection)
+    cur.execute("""
+        INSERT INTO users (username, email, password, role)
+        SELECT 'consultant' || i, 'consultant' || i || '@bench', '-', 'consultant'
+        FROM generate_series(1, %s) i
+    """, (consultants,))
+    cur.execute("""
+        INSERT INTO users (username, email, password, role)
+        SELECT 'user' || i, 'user' || i || '@bench', '-', 'user'
+        FROM generate_series(1, %s) i
+    """, (users,))
+
+
+def reset(cur):
+    cur.execute("TRUNCATE bookings, credit_ledger, credit_balances")
+    cur.execute("""
+        INSERT INTO credit_ledger (user_id, delta, reason)
+        SELECT id, %s, 'bench' FROM users WHERE role = 'user'
+    """, (BALANCE,))
+
+
+def reserve_locking(conn, cur, consultant_id, username, day, hour):
+    cur.execute("SELECT 1 FROM users WHERE id = %s AND role = 'consultant' FOR UPDATE", (consultant_id,))
+    if not cur.fetchone():
+        conn.rollback()
+        return False
+    cur.execute("SELECT 1 FROM bookings WHERE consultant_id = %s AND slot_date = current_date + %s - 1 AND hour = %s",
+                (consultant_id, day, hour))
+    if cur.fetchone():
+        conn.rollback()
+        return False
+    cur.execute("""
+        SELECT b.user_id FROM credit_balances b JOIN users u ON u.id = b.user_id
+        WHERE u.username = %s FOR UPDATE OF b
+    """, (username,))
+    user_id, = cur.fetchone()
+    cur.execute("INSERT INTO credit_ledger (user_id, delta, reason) VALUES (%s, -50, 'reservation')", (user_id,))
+    cur.execute("""
+        INSERT INTO bookings (consultant_id, slot_date, hour, user_id)
+        VALUES (%s, current_date + %s - 1, %s, %s) ON CONFLICT DO NOTHING RETURNING user_id
+    """, (consultant_id, day, hour, user_id))
+    if not cur.fetchone():
+        conn.rollback()
+        return False
+    conn.commit()
+    return True
+
+
+def reserve_single(conn, cur, consultant_id, username, day, hour):
+    cur.execute(RESERVE_SLOT, {"consultant_id": consultant_id, "username": username, "day": day, "hour": hour})
+    result = cur.fetchone()
+    conn.commit()
+    return result[3]
+
+
+def run(label, reserve, threads, slots):
+    barrier = threading.Barrier(threads + 1)
+    won = [0] * threads
+    errors = []
+    latencies = [[] for _ in range(threads)]
+
+    def worker(n):
+        conn = connect(SCHEMA)
+        conn.autocommit = False
+        cur = conn.cursor()
+        barrier.wait()
+        try:
+            for consultant_id, day, hour in slots:
+                start = time.perf_counter()
+                if reserve(conn, cur, consultant_id, f"user{n + 1}", day, hour):
+                    won[n] += 1
+                latencies[n].append(time.perf_counter() - start)
+        except psycopg2.Error as e:
+            # a lost race is an empty result, never an error
+            errors.append(e)
+        finally:
+            cur.close()
+            conn.close()
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for w in workers:
+        w.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+
+    attempts = sorted(l for per_thread in latencies for l in per_thread)
+    p99 = attempts[int(len(attempts) * 0.99) - 1]
+    print(
+        f"{label:<16} {len(attempts) / elapsed:>9.0f} attempts/s"
+        f"  booked {sum(won)}/{len(slots)}"
+        f"  p99 {p99 * 1000:>8.2f} ms  total {elapsed:>6.2f} s"
+    )
+
+
+def main():
+    p = parser(__doc__)
+    p.add_argument("--threads", type=int, default=32)
+    p.add_argument("--consultants", type=int, default=20)
+    args = p.parse_args()
+
+    conn = bench_connection(SCHEMA)
+    cur = conn.cursor()
+    try:
+        seed(cur, args.consultants, args.threads)
+        cur.execute("SELECT id FROM users WHERE role = 'consultant' ORDER BY id")
+        consultant_ids = [row[0] for row in cur.fetchall()]
+        slots = [(c, day, hour) for day in range(1, 4) for hour in range(1, 9) for c in consultant_ids]
+
+        for label, reserve in (("lock-based", reserve_locking), ("single statement", reserve_single)):
+            reset(cur)
+            run(label, reserve, args.threads, slots)
+
+    finally:
+        cur.close()
+        if not args.keep:
+            drop_schema(conn, SCHEMA)
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,33 @@
 # controllers/chat.py
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, jsonify, Response
 from datetime import datetime, timezone
+import json
+import queue
 
-from models.chat import get_or_create_chat, delete_chat, get_chat_pair
-from models.messages import get_messages
+from models.chat import members_cache, get_or_create_chat, delete_chat, get_chat, get_chat_pair, get_chat_members, get_chat_state
+from models.messages import add_message, CHAT_ENDED, get_messages, get_messages_after, get_message_cursor, subscribe_chat, unsubscribe_chat
 from models.reviews import allow_review
 from models.db import get_one, get_all, execute
+from models.pages import invalidate_pages
 
 chat_bp = Blueprint('chat', __name__)
 
+STREAM_KEEPALIVE = 15   # seconds between keep-alive comments on an idle stream
+
 # ---------------------------------------------------------
 # Correct time-slot checker
 # ---------------------------------------------------------
 def get_current_slot():
-    return 1, 1
     now = datetime.now(timezone.utc).astimezone()
-    weekday = now.weekday()  # Monday=0
-    if weekday not in (0, 1, 2):
-        return None, None  # only Mon–Wed
 
-    day = weekday + 1
+    # Bookings are stored by date and the view starts today
+    day = 1
 
     hour_of_day = now.hour
-    if 8 <= hour_of_day <= 12:
-        hour = hour_of_day - 7        # 8→1 … 12→5
-    elif 13 <= hour_of_day <= 17:
-        hour = hour_of_day - 8        # 13→5 … 17→9
+    if 8 <= hour_of_day <= 11:
+        hour = hour_of_day - 7        # 8→1 … 11→4
+    elif 13 <= hour_of_day <= 16:
+        hour = hour_of_day - 8        # 13→5 … 16→8
     else:
         return None, None
 
@@ -116,20 +118,20 @@ def send_message():
     chat_id = int(chat_id)
 
     # Check membership
-    chat_row = get_one("""
-        SELECT user_id, consultant_id
-        FROM chat WHERE id = %s
-    """, (chat_id,))
+    chat_row = get_chat_members(chat_id)
 
     if not chat_row or user_id not in (chat_row["user_id"], chat_row["consultant_id"]):
         return jsonify({"success": False, "error": "Forbidden"}), 403
 
     # Insert message
-    msg = get_one("""
-        INSERT INTO messages (message, chat_id, sender_id)
-        VALUES (%s, %s, %s)
-        RETURNING id, sent_at
-    """, (message, chat_id, user_id))
+    msg = add_message(chat_id, user_id, message)
+
+    if msg == CHAT_ENDED:
+        members_cache.pop(chat_id)
+        return jsonify({"success": False, "error": msg}), 410
+
+    if isinstance(msg, str):
+        return jsonify({"success": False, "error": msg}), 500
 
     return jsonify({
         "success": True,
@@ -153,26 +155,85 @@ def poll_chat(chat_id):
     after_id = int(after_id) if after_id.isdigit() else 0
 
     # Check membership
-    chat_row = get_one("""
-        SELECT user_id, consultant_id
-        FROM chat WHERE id = %s
-    """, (chat_id,))
+    chat_row = get_chat_members(chat_id)
 
     if not chat_row or user_id not in (chat_row["user_id"], chat_row["consultant_id"]):
         return jsonify({"messages": []})
 
-    msgs = get_all("""
-        SELECT id, message, sent_at,
-        CASE WHEN sender_id = %s THEN TRUE ELSE FALSE END AS is_mine
-        FROM messages
-        WHERE chat_id = %s AND id > %s
-        ORDER BY id ASC
-    """, (user_id, chat_id, after_id))
+    # the newest id versions the answer once no message is left to settle
+    last_id, recent = get_message_cursor(chat_id)
+    etag = None if recent else f"chat-{chat_id}-{user_id}-{after_id}-{last_id}"
+    if etag and etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        msgs = get_messages_after(chat_id, after_id, user_id)
 
-    for m in msgs:
-        m["sent_at"] = m["sent_at"].strftime("%H:%M")
+        for m in msgs:
+            m["sent_at"] = m["sent_at"].strftime("%H:%M")
+
+        response = jsonify({"messages": msgs})
+
+    if etag:
+        response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+# ---------------------------------------------------------
+# Push new messages (Server-Sent Events)
+# ---------------------------------------------------------
+@chat_bp.route("/chat/stream/<int:chat_id>", methods=["GET"])
+def stream_chat(chat_id):
+    user_id = session.get("user_id")
+    role = session.get("role", "guest")
 
-    return jsonify({"messages": msgs})
+    if role not in ("user", "consultant") or not user_id:
+        return jsonify({"error": "Not allowed"}), 403
+
+    # Check membership
+    chat_row = get_chat_members(chat_id)
+
+    if not chat_row or user_id not in (chat_row["user_id"], chat_row["consultant_id"]):
+        return jsonify({"error": "Forbidden"}), 403
+
+    # EventSource sends the last id it saw when it reconnects
+    after_id = request.headers.get("Last-Event-ID") or request.args.get("after", "0")
+    after_id = int(after_id) if after_id.isdigit() else 0
+
+    def events(last_id):
+        # subscribe before the first read so no commit falls in between
+        q = subscribe_chat(chat_id)
+        # ids of the previous read; the settle window returns them again,
+        # anything that left it is never read again
+        sent = set()
+        try:
+            while True:
+                # read from the primary, the notification may outrun a replica
+                msgs = get_messages_after(chat_id, last_id, user_id, readonly=False)
+                for m in msgs:
+                    if m["id"] in sent:
+                        continue
+                    last_id = max(last_id, m["id"])
+                    m["sent_at"] = m["sent_at"].strftime("%H:%M")
+                    # the event id is the cursor a reconnect resumes from
+                    yield f"id: {last_id}\ndata: {json.dumps(m)}\n\n"
+                sent = {m["id"] for m in msgs}
+
+                try:
+                    q.get(timeout=STREAM_KEEPALIVE)
+                    # several inserts can be fetched by one read
+                    while not q.empty():
+                        q.get_nowait()
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+        finally:
+            unsubscribe_chat(chat_id, q)
+
+    return Response(events(after_id), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
 
 
 # ---------------------------------------------------------
@@ -195,10 +256,9 @@ def leave_chat():
 
     chat_id = int(chat_id)
 
-    chat_row = get_one("""
-        SELECT user_id, consultant_id
-        FROM chat WHERE id = %s
-    """, (chat_id,))
+    # from the primary, not the members cache: a chat deleted by another
+    # worker must not free a slot someone else has booked since
+    chat_row = get_chat(chat_id)
 
     if not chat_row:
         flash("Chat does not exist.", "error")
@@ -212,14 +272,19 @@ def leave_chat():
     day, hour = get_current_slot()
     if day:
         execute("""
-            UPDATE users
-            SET timetable[%s][%s] = NULL
-            WHERE id = %s
-        """, (day, hour, chat_row["consultant_id"]))
+            DELETE FROM bookings
+            WHERE consultant_id = %s AND user_id = %s
+              AND slot_date = current_date + %s - 1 AND hour = %s
+        """, (chat_row["consultant_id"], chat_row["user_id"], day, hour))
+        invalidate_pages('timetables')
 
     allow_review(chat_row["user_id"], chat_row["consultant_id"])
 
-    delete_chat(chat_id)
+    # a failed delete rolls back the freed slot and the review as well
+    err = delete_chat(chat_id)
+    if err:
+        flash(err, "error")
+        return redirect(url_for("timetables.timetables"))
 
     if role == "user":
         flash("Chat ended. You can now leave a review.", "success")
@@ -228,6 +293,20 @@ def leave_chat():
 
 
 
+# ---------------------------------------------------------
+# End a chat whose slot is over
+# ---------------------------------------------------------
+def end_chat(chat_id, chat_row):
+    # chat_row may come from a cache or a replica, only end a chat that
+    # still exists so a stale entry can't grant another review
+    if not get_chat(chat_id):
+        return
+
+    # Allow one review
+    allow_review(chat_row["user_id"], chat_row["consultant_id"])
+    delete_chat(chat_id)
+
+
 # ---------------------------------------------------------
 # Auto-expire chat (polled every second)
 # ---------------------------------------------------------
@@ -240,10 +319,7 @@ def check_active(chat_id):
     if role not in ("user", "consultant") or not user_id:
         return jsonify({"active": False})
 
-    chat_row = get_one("""
-        SELECT user_id, consultant_id
-        FROM chat WHERE id = %s
-    """, (chat_id,))
+    chat_row = get_chat_members(chat_id)
 
     if not chat_row:
         return jsonify({"active": False})
@@ -255,24 +331,72 @@ def check_active(chat_id):
     day, hour = get_current_slot()
 
     if not day:
-        # Allow one review
-        allow_review(chat_row["user_id"], chat_row["consultant_id"])
-
-        delete_chat(chat_id)
+        end_chat(chat_id, chat_row)
         return jsonify({"active": False})
 
 
-    # Check consultant's timetable slot
+    # Check consultant's booking for the slot
     scheduled = get_one("""
-        SELECT timetable[%s][%s] AS u
-        FROM users
-        WHERE id = %s
-    """, (day, hour, chat_row["consultant_id"]))
+        SELECT user_id AS u
+        FROM bookings
+        WHERE consultant_id = %s AND slot_date = current_date + %s - 1 AND hour = %s
+    """, (chat_row["consultant_id"], day, hour))
 
     if not scheduled or scheduled["u"] != chat_row["user_id"]:
-        allow_review(chat_row["user_id"], chat_row["consultant_id"])
-        delete_chat(chat_id)
+        end_chat(chat_id, chat_row)
         return jsonify({"active": False})
 
 
     return jsonify({"active": True})
+
+
+# ---------------------------------------------------------
+# Sync: new messages + active status in one request,
+# only the status while the page has the stream open
+# ---------------------------------------------------------
+@chat_bp.route("/chat/sync/<int:chat_id>", methods=["GET"])
+def sync_chat(chat_id):
+    user_id = session.get("user_id")
+    role = session.get("role", "guest")
+
+    after_id = request.args.get("after", "0")
+    after_id = int(after_id) if after_id.isdigit() else 0
+
+    inactive = jsonify({"active": False, "messages": [], "cursor": after_id})
+
+    if role not in ("user", "consultant") or not user_id:
+        return inactive
+
+    day, hour = get_current_slot()
+    state = get_chat_state(chat_id, day, hour)
+
+    if not state or user_id not in (state["user_id"], state["consultant_id"]):
+        return inactive
+
+    if day and state["booked_user"] != state["user_id"]:
+        # a lagging replica may not have the booking yet, decide on the primary
+        state = get_chat_state(chat_id, day, hour, readonly=False)
+        if not state:
+            return inactive
+
+    if not day or state["booked_user"] != state["user_id"]:
+        end_chat(chat_id, state)
+        return inactive
+
+    if request.args.get("status_only"):
+        return jsonify({"active": True, "messages": [], "cursor": after_id})
+
+    # Nothing new since the client's cursor and nothing left to settle
+    cursor = state["last_message_id"] or 0
+    etag = f'"{chat_id}-{cursor}"'
+    if cursor <= after_id and not state["recent"]:
+        return Response(status=304, headers={"ETag": etag})
+
+    msgs = get_messages_after(chat_id, after_id, user_id)
+    for m in msgs:
+        m["sent_at"] = m["sent_at"].strftime("%H:%M")
+        cursor = max(cursor, m["id"])
+
+    response = jsonify({"active": True, "messages": msgs, "cursor": cursor})
+    response.headers["ETag"] = etag
+    return response
@@ -1,15 +1,29 @@
 # controllers/faq.py
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models.faqs import get_faqs, delete_faq, create_faq
+from models.faqs import get_faqs, search_faqs, delete_faq, create_faq
+from models.pages import cached_page, conditional
 
 faq_bp = Blueprint('faq', __name__)
 
 @faq_bp.route('/faq', methods=['GET', 'POST'])
+@conditional('faqs')
+@cached_page('faq')
 def faq():
     if request.method == 'GET':
         data = {}
         data["role"] = session.get('role', 'guest')
-        data["faqs"] = get_faqs()
+        data["query"] = request.args.get('q', '').strip()
+
+        if data["query"]:
+            data["page"] = max(request.args.get('page', 1, type=int), 1)
+            results = search_faqs(data["query"], data["page"])
+            if isinstance(results, str):
+                flash(results, "error")
+                results = {"rows": [], "next": False}
+            data["faqs"] = results["rows"]
+            data["next"] = results["next"]
+        else:
+            data["faqs"] = get_faqs()
         return render_template('faq.html', data=data)
     elif request.method == 'POST':
         if session.get('role', 'guest') != 'admin':
@@ -1,7 +1,8 @@
 # controllers/login.py
-import bcrypt
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models.users import check_length, get_credentials
+from models.users import check_length, get_credentials, update_password
+from models.auth import check_password, HashBusy
+from models.db import end_request_transaction
 
 login_bp = Blueprint('login', __name__)
 
@@ -28,9 +29,19 @@ def login():
             flash(response, "error")
             return render_template('login.html')
 
-        password_is_valid = bcrypt.checkpw(password.encode('utf-8'), response['password'].encode('utf-8'))
+        # don't pin a pooled connection while waiting for bcrypt
+        end_request_transaction()
+
+        try:
+            password_is_valid, new_hash = check_password(password, response['password'])
+        except HashBusy:
+            flash("Too many logins right now, please try again in a moment.", "error")
+            return render_template('login.html'), 503, {"Retry-After": "2"}
 
         if password_is_valid:
+            if new_hash:
+                # BCRYPT_ROUNDS changed since this hash was made
+                update_password(response['id'], new_hash)
             session['username'] = username
             session['role'] = response['role']
             session['user_id'] = response['id']
@@ -1,7 +1,8 @@
 # controllers/register.py
-import bcrypt
 from flask import Blueprint, request, redirect, url_for, flash, render_template
 from models.users import check_length, register_user
+from models.auth import hash_password, HashBusy
+from models.db import end_request_transaction
 
 register_bp = Blueprint('register', __name__)
 
@@ -20,7 +21,14 @@ def register():
             flash(f"Password must be between {err} characters.", "error")
             return render_template('register.html')
 
-        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        # don't pin a pooled connection while waiting for bcrypt
+        end_request_transaction()
+
+        try:
+            hashed = hash_password(password)
+        except HashBusy:
+            flash("The server is busy, please try again in a moment.", "error")
+            return render_template('register.html'), 503, {"Retry-After": "2"}
 
         if (err := register_user(username, hashed, email)):
             flash(err, "error")
@@ -1,7 +1,8 @@
 # controllers/register_consultant.py
-import bcrypt
 from flask import Blueprint, request, redirect, url_for, flash, render_template, session
 from models.users import check_length, register_user
+from models.auth import hash_password, HashBusy
+from models.db import end_request_transaction
 
 register_consultant_bp = Blueprint('register_consultant', __name__)
 
@@ -24,7 +25,14 @@ def register_consultant():
             flash(f"Password must be between {err} characters.", "error")
             return render_template('register_consultant.html')
 
-        hashed = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        # don't pin a pooled connection while waiting for bcrypt
+        end_request_transaction()
+
+        try:
+            hashed = hash_password(password)
+        except HashBusy:
+            flash("The server is busy, please try again in a moment.", "error")
+            return render_template('register_consultant.html'), 503, {"Retry-After": "2"}
 
         if (err := register_user(username, hashed, email, 'consultant')):
             flash(err, "error")
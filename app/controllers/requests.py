@@ -1,10 +1,23 @@
 # controllers/requests.py
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models.requests import get_requests, create_request, delete_request, approve_all
-from models.users import add_credits
+from models.requests import get_requests_page, get_user_requests, create_request, delete_request, start_approve_all, get_approve_job, approve_selected, deny_selected
+from models.pagination import decode_cursor
 
 requests_bp = Blueprint('requests', __name__)
 
+def get_request_ids():
+    # a single approve posts request_id, the bulk form posts request_ids
+    values = request.form.getlist("request_ids") or request.form.getlist("request_id")
+    return list(dict.fromkeys(int(v) for v in values if v.isdigit()))
+
+def flash_outcomes(outcomes, done):
+    handled = [i for i, outcome in outcomes.items() if outcome == done]
+    missing = [i for i, outcome in outcomes.items() if outcome != done]
+    if handled:
+        flash(f"{len(handled)} request(s) {done}.", "success")
+    if missing:
+        flash(f"Request(s) {', '.join(f'#{i}' for i in missing)} were already handled or do not exist.", "error")
+
 @requests_bp.route('/requests', methods=['GET', 'POST'])
 def requests():
     role = session.get('role', 'guest')
@@ -13,19 +26,27 @@ def requests():
     if request.method == 'GET':
         data = {}
         data["role"] = role
+        before = decode_cursor(request.args.get("before"))
 
         if role == 'admin':
-            # Admin sees all requests
-            data["requests"] = get_requests()
+            # Admin sees all requests, one page at a time
+            page = get_requests_page(before)
         elif role == 'user':
             # User sees only their own requests
-            all_requests = get_requests()
-            user_id = session.get("user_id")
-            data["requests"] = [r for r in all_requests if r["user_id"] == user_id]
+            page = get_user_requests(session.get("user_id"), before)
         else:
             flash(f"You do not have permisions to access that page.", "error")
             return redirect(url_for('timetables.timetables'))
 
+        if isinstance(page, str):
+            flash(page, "error")
+            page = {"rows": [], "next": None}
+
+        data["requests"] = page["rows"]
+        data["next"] = page["next"]
+        data["paged"] = before is not None
+        if role == 'admin':
+            data["approve_job"] = get_approve_job()
         return render_template('requests.html', data=data)
 
     if request.method == 'POST':
@@ -62,29 +83,49 @@ def requests():
                 flash("Only admins can approve requests.", "error")
                 return redirect(url_for('requests.requests'))
 
-            err = approve_all()
+            err = start_approve_all()
             if err:
                 flash(err, "error")
             else:
-                flash("Requests approved and credits added.", "success")
+                flash("Approving all requests, reload the page to follow the progress.", "success")
 
             return redirect(url_for('requests.requests'))
 
-        if action == "approve":
+        if action in ("approve", "approve-selected"):
             if role != "admin":
                 flash("Only admins can approve requests.", "error")
                 return redirect(url_for('requests.requests'))
 
-            req_id = request.form.get("request_id")
-            username = request.form.get("username")
-            amount = request.form.get("amount")
+            request_ids = get_request_ids()
+            if not request_ids:
+                flash("No requests selected.", "error")
+                return redirect(url_for('requests.requests'))
 
-            err = add_credits(username, amount)
-            if err:
-                flash(err, "error")
+            result = approve_selected(request_ids)
+            if isinstance(result, str):
+                flash(result, "error")
+            else:
+                flash_outcomes(result["outcomes"], "approved")
+                if result["credits"]:
+                    flash(f"{result['credits']} credits added.", "success")
+
+            return redirect(url_for('requests.requests'))
+
+        if action == "deny-selected":
+            if role != "admin":
+                flash("Only admins can deny requests.", "error")
+                return redirect(url_for('requests.requests'))
+
+            request_ids = get_request_ids()
+            if not request_ids:
+                flash("No requests selected.", "error")
+                return redirect(url_for('requests.requests'))
+
+            result = deny_selected(request_ids)
+            if isinstance(result, str):
+                flash(result, "error")
             else:
-                delete_request(req_id)
-                flash("Request approved and credits added.", "success")
+                flash_outcomes(result["outcomes"], "denied")
 
             return redirect(url_for('requests.requests'))
 
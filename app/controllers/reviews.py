@@ -1,6 +1,8 @@
 # controllers/reviews.py
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models.reviews import get_reviews, create_review, allow_review, get_popular_consultants
+from models.reviews import get_reviews_page, create_review, allow_review, get_popular_consultants
+from models.pagination import decode_cursor
+from models.pages import cached_page, conditional
 from models.db import get_one, execute
 
 reviews_bp = Blueprint('reviews', __name__)
@@ -10,10 +12,25 @@ reviews_bp = Blueprint('reviews', __name__)
 # Show all reviews
 # ---------------------------------------------------------
 @reviews_bp.route('/reviews', methods=['GET'])
+@conditional('users', 'reviews', 'consultant_ratings')
+@cached_page('reviews')
 def reviews():
+    consultant_id = request.args.get("consultant", type=int)
+    rating = request.args.get("rating", type=int)
+    if rating not in range(1, 6):
+        rating = None
+
+    page = get_reviews_page(decode_cursor(request.args.get("before")), consultant_id, rating)
+    if isinstance(page, str):
+        flash(page, "error")
+        page = {"rows": [], "next": None}
+
     data = {
         "role": session.get("role", "guest"),
-        "reviews": get_reviews(),
+        "reviews": page["rows"],
+        "next": page["next"],
+        "paged": "before" in request.args,
+        "filters": {"consultant": consultant_id, "rating": rating},
         "popular_consultants": get_popular_consultants()
     }
     return render_template('reviews.html', data=data)
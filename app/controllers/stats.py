@@ -0,0 +1,28 @@
+from flask import Blueprint, redirect, url_for, session, flash, jsonify
+from models.db import get_pool_stats, get_replica_stats, get_query_stats
+from models.users import credits_cache
+from models.chat import members_cache
+from models.pages import page_cache
+from models.auth import get_hash_stats
+from models.ratelimit import get_limit_stats
+
+stats_bp = Blueprint('stats', __name__)
+
+@stats_bp.route('/stats', methods=['GET'])
+def stats():
+    if session.get('role', 'guest') != 'admin':
+        flash(f"You do not have permisions to access that page.", "error")
+        return redirect(url_for('timetables.timetables'))
+
+    return jsonify({
+        "pool": get_pool_stats(),
+        "replicas": get_replica_stats(),
+        "queries": get_query_stats(),
+        "hashing": get_hash_stats(),
+        "limits": get_limit_stats(),
+        "caches": {
+            "credits": credits_cache.stats(),
+            "chat_members": members_cache.stats(),
+            "pages": page_cache.stats(),
+        }
+    })
@@ -1,17 +1,26 @@
 # controllers/timetables.py
 from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models.users import get_consultants, reserve_slot, cancel_slot
+from models.users import get_consultants, get_bookings, reserve_slot, cancel_slot
+from models.pages import cached_page, conditional
 from .chat import get_current_slot
 
 timetables_bp = Blueprint('timetables', __name__)
 
 @timetables_bp.route('/timetables', methods=['GET', 'POST'])
+@conditional('users', 'bookings')
+@cached_page('timetables')
 def timetables():
     if request.method == 'GET':
         data = {}
         data["timeslot"] = get_current_slot()
         data["role"] = session.get('role', 'guest')
         data["consultants"] = get_consultants()
+        if data["role"] == 'user':
+            bookings = get_bookings(session.get('user_id'))
+            if isinstance(bookings, str):
+                flash(bookings, "error")
+                bookings = []
+            data["bookings"] = bookings
         return render_template('timetables.html', data=data)
 
     elif request.method == 'POST':
@@ -1,6 +1,6 @@
 # controllers/view_users.py
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
-from models.users import get_users
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, stream_template, get_flashed_messages
+from models.users import iter_users
 
 view_users_bp = Blueprint('view_users', __name__)
 
@@ -9,5 +9,6 @@ def view_users():
     if session.get('role', 'guest') != 'admin':
         flash(f"You do not have permisions to access that page.", "error")
         return redirect(url_for('timetables.timetables'))
-    data = get_users()
-    return render_template('view_users.html', data=data)
+    # pop flashes now, the session is saved before the stream is sent
+    get_flashed_messages(with_categories=True)
+    return stream_template('view_users.html', data=iter_users())
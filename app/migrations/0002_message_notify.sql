@@ -0,0 +1,17 @@
+-- Publish every new chat message on the chat_messages channel so open
+-- chat streams are pushed new message ids instead of polling for them.
+-- The payload is "<chat_id>:<message_id>", delivered when the insert commits.
+
+CREATE OR REPLACE FUNCTION notify_new_message()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('chat_messages', NEW.chat_id || ':' || NEW.id);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS messages_notify ON messages;
+
+CREATE TRIGGER messages_notify
+AFTER INSERT ON messages
+FOR EACH ROW EXECUTE FUNCTION notify_new_message();
@@ -0,0 +1,7 @@
+-- no-transaction
+-- (chat_id, id) answers both "messages after id" and the latest message
+-- id of a chat from the index, it replaces the plain chat_id index.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_messages_chat_id_id ON messages(chat_id, id);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_messages_chat_id;
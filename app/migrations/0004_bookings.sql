@@ -0,0 +1,48 @@
+-- Reservations move out of users.timetable into their own table, indexed
+-- from both sides. The INT[3][8] timetable stays available as a view.
+
+CREATE TABLE IF NOT EXISTS bookings (
+    consultant_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day SMALLINT NOT NULL CHECK (day BETWEEN 1 AND 3),
+    hour SMALLINT NOT NULL CHECK (hour BETWEEN 1 AND 8),
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    PRIMARY KEY (consultant_id, day, hour)
+);
+
+CREATE INDEX IF NOT EXISTS idx_bookings_user_id ON bookings(user_id, day, hour);
+
+INSERT INTO bookings (consultant_id, day, hour, user_id)
+SELECT u.id, d, h, u.timetable[d][h]
+FROM users u, generate_series(1, 3) d, generate_series(1, 8) h
+WHERE u.role = 'consultant' AND u.timetable[d][h] IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+ALTER TABLE users DROP COLUMN IF EXISTS timetable;
+
+CREATE OR REPLACE VIEW consultant_timetables AS
+SELECT c.id, c.username,
+       ARRAY(
+           SELECT ARRAY(
+               SELECT b.user_id
+               FROM generate_series(1, 8) h
+               LEFT JOIN bookings b
+                      ON b.consultant_id = c.id AND b.day = d AND b.hour = h
+               ORDER BY h
+           )
+           FROM generate_series(1, 3) d
+           ORDER BY d
+       ) AS timetable
+FROM users c
+WHERE c.role = 'consultant';
+
+-- Same job, now it only touches the bookings. Day by day so the primary
+-- key never sees two bookings for the same slot mid-statement.
+CREATE OR REPLACE FUNCTION shift_consultant_timetables()
+RETURNS void AS $$
+BEGIN
+    DELETE FROM bookings WHERE day = 1;
+    UPDATE bookings SET day = 1 WHERE day = 2;
+    UPDATE bookings SET day = 2 WHERE day = 3;
+END;
+$$ LANGUAGE plpgsql;
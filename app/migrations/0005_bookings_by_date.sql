@@ -0,0 +1,49 @@
+-- Bookings are keyed by their absolute date instead of a 1-3 day offset,
+-- so a new day starts without rewriting anything. Reads only look at
+-- today and the next two days; past bookings are purged off-peak.
+
+DROP VIEW IF EXISTS consultant_timetables;
+
+ALTER TABLE bookings ADD COLUMN slot_date DATE;
+UPDATE bookings SET slot_date = current_date + day - 1;
+ALTER TABLE bookings ALTER COLUMN slot_date SET NOT NULL;
+
+ALTER TABLE bookings DROP CONSTRAINT bookings_pkey;
+DROP INDEX IF EXISTS idx_bookings_user_id;
+ALTER TABLE bookings DROP COLUMN day;
+
+ALTER TABLE bookings ADD PRIMARY KEY (consultant_id, slot_date, hour);
+CREATE INDEX idx_bookings_user_id ON bookings(user_id, slot_date, hour);
+
+-- Day 1 of the view is today
+CREATE VIEW consultant_timetables AS
+SELECT c.id, c.username,
+       ARRAY(
+           SELECT ARRAY(
+               SELECT b.user_id
+               FROM generate_series(1, 8) h
+               LEFT JOIN bookings b
+                      ON b.consultant_id = c.id AND b.slot_date = current_date + d - 1 AND b.hour = h
+               ORDER BY h
+           )
+           FROM generate_series(1, 3) d
+           ORDER BY d
+       ) AS timetable
+FROM users c
+WHERE c.role = 'consultant';
+
+CREATE OR REPLACE FUNCTION purge_expired_bookings()
+RETURNS void AS $$
+BEGIN
+    DELETE FROM bookings WHERE slot_date < current_date;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT cron.unschedule(jobid) FROM cron.job WHERE jobname = 'shift_timetables_midnight';
+DROP FUNCTION IF EXISTS shift_consultant_timetables();
+
+SELECT cron.schedule(
+    'purge_expired_bookings',
+    '30 3 * * *',
+    $$ SELECT purge_expired_bookings(); $$
+);
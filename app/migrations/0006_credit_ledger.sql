@@ -0,0 +1,57 @@
+-- Credits move out of users into an append-only ledger of signed entries.
+-- credit_balances keeps one narrow row per user, updated by a trigger on
+-- every ledger insert, so credit changes no longer lock or rewrite users.
+
+CREATE TABLE IF NOT EXISTS credit_ledger (
+    id BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    delta INT NOT NULL CHECK (delta <> 0),
+    reason TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_credit_ledger_user_id ON credit_ledger(user_id, id);
+
+CREATE TABLE IF NOT EXISTS credit_balances (
+    user_id INT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    balance INT NOT NULL DEFAULT 0 CHECK (balance >= 0)
+);
+
+-- Opening entries and balances are written before the trigger exists so
+-- they are not applied twice
+INSERT INTO credit_ledger (user_id, delta, reason)
+SELECT id, credits, 'opening balance'
+FROM users
+WHERE credits > 0;
+
+INSERT INTO credit_balances (user_id, balance)
+SELECT id, credits
+FROM users
+WHERE credits > 0;
+
+ALTER TABLE users DROP COLUMN credits;
+
+-- A debit past zero fails the balance CHECK and aborts the whole statement.
+-- Not an INSERT ... ON CONFLICT DO UPDATE: the CHECK is tested on the
+-- proposed row first, so every debit would fail as a negative balance.
+CREATE OR REPLACE FUNCTION apply_credit_entry()
+RETURNS trigger AS $$
+BEGIN
+    UPDATE credit_balances SET balance = balance + NEW.delta
+    WHERE user_id = NEW.user_id;
+    IF NOT FOUND THEN
+        -- first entry of the user, a concurrent one may create the row too
+        INSERT INTO credit_balances (user_id) VALUES (NEW.user_id)
+        ON CONFLICT (user_id) DO NOTHING;
+        UPDATE credit_balances SET balance = balance + NEW.delta
+        WHERE user_id = NEW.user_id;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS credit_ledger_apply ON credit_ledger;
+
+CREATE TRIGGER credit_ledger_apply
+AFTER INSERT ON credit_ledger
+FOR EACH ROW EXECUTE FUNCTION apply_credit_entry();
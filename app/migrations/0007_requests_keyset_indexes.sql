@@ -0,0 +1,26 @@
+-- no-transaction
+-- Credit request pages are read newest first and keyset-paginated on
+-- (created_at, id): the admin listing walks idx_requests_created_at_id,
+-- a user's own requests come from idx_requests_user_id, which now
+-- includes the same ordering.
+
+-- The cursor needs created_at on every row. SET NOT NULL would scan the
+-- table under an ACCESS EXCLUSIVE lock; a NOT VALID check is added
+-- instantly and validated under a lock that lets reads and writes go on.
+-- The column has always defaulted to now(), the UPDATE normally finds
+-- nothing and only locks the rows it fixes.
+UPDATE requests SET created_at = now() WHERE created_at IS NULL;
+
+ALTER TABLE requests DROP CONSTRAINT IF EXISTS requests_created_at_not_null;
+
+ALTER TABLE requests ADD CONSTRAINT requests_created_at_not_null CHECK (created_at IS NOT NULL) NOT VALID;
+
+ALTER TABLE requests VALIDATE CONSTRAINT requests_created_at_not_null;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_requests_created_at_id ON requests(created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_requests_user_id_created_at_id ON requests(user_id, created_at, id);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_requests_user_id;
+
+ALTER INDEX idx_requests_user_id_created_at_id RENAME TO idx_requests_user_id;
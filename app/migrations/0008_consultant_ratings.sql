@@ -0,0 +1,73 @@
+-- Per-consultant rating totals, kept in step with reviews by a trigger so
+-- ranking consultants reads one small row each instead of aggregating
+-- every review. histogram[n] counts the reviews rated n.
+
+CREATE TABLE IF NOT EXISTS consultant_ratings (
+    consultant_id INT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    review_count INT NOT NULL DEFAULT 0,
+    rating_sum INT NOT NULL DEFAULT 0,
+    histogram INT[] NOT NULL DEFAULT '{0,0,0,0,0}'
+);
+
+CREATE OR REPLACE FUNCTION apply_review_rating()
+RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE consultant_ratings
+        SET review_count = review_count - 1,
+            rating_sum = rating_sum - OLD.rating,
+            histogram[OLD.rating] = histogram[OLD.rating] - 1
+        WHERE consultant_id = OLD.consultant_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO consultant_ratings (consultant_id)
+        VALUES (NEW.consultant_id)
+        ON CONFLICT DO NOTHING;
+
+        UPDATE consultant_ratings
+        SET review_count = review_count + 1,
+            rating_sum = rating_sum + NEW.rating,
+            histogram[NEW.rating] = histogram[NEW.rating] + 1
+        WHERE consultant_id = NEW.consultant_id;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS reviews_rating ON reviews;
+
+CREATE TRIGGER reviews_rating
+AFTER INSERT OR DELETE OR UPDATE OF rating, consultant_id ON reviews
+FOR EACH ROW EXECUTE FUNCTION apply_review_rating();
+
+-- Recomputes every row from reviews, for backfills and repairs. The SHARE
+-- lock keeps reviews from changing while the totals are rebuilt.
+CREATE OR REPLACE FUNCTION rebuild_consultant_ratings()
+RETURNS integer AS $$
+DECLARE
+    rebuilt integer;
+BEGIN
+    LOCK TABLE reviews IN SHARE MODE;
+
+    DELETE FROM consultant_ratings;
+
+    INSERT INTO consultant_ratings (consultant_id, review_count, rating_sum, histogram)
+    SELECT consultant_id, count(*), sum(rating),
+           ARRAY[
+               count(*) FILTER (WHERE rating = 1),
+               count(*) FILTER (WHERE rating = 2),
+               count(*) FILTER (WHERE rating = 3),
+               count(*) FILTER (WHERE rating = 4),
+               count(*) FILTER (WHERE rating = 5)
+           ]
+    FROM reviews
+    GROUP BY consultant_id;
+
+    GET DIAGNOSTICS rebuilt = ROW_COUNT;
+    RETURN rebuilt;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_consultant_ratings();
@@ -0,0 +1,25 @@
+-- no-transaction
+-- Reviews are listed newest first, keyset-paginated on (created_at, id)
+-- and optionally filtered by consultant or rating. Each filter has an
+-- index leading with it, so a page's ids come from an index-only scan.
+
+-- The cursor needs created_at on every row. SET NOT NULL would scan the
+-- table under an ACCESS EXCLUSIVE lock; a NOT VALID check is added
+-- instantly and validated under a lock that lets reads and writes go on.
+-- The column has always defaulted to now(), the UPDATE normally finds
+-- nothing and only locks the rows it fixes.
+UPDATE reviews SET created_at = now() WHERE created_at IS NULL;
+
+ALTER TABLE reviews DROP CONSTRAINT IF EXISTS reviews_created_at_not_null;
+
+ALTER TABLE reviews ADD CONSTRAINT reviews_created_at_not_null CHECK (created_at IS NOT NULL) NOT VALID;
+
+ALTER TABLE reviews VALIDATE CONSTRAINT reviews_created_at_not_null;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reviews_created_at_id ON reviews(created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reviews_consultant_id_created_at_id ON reviews(consultant_id, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reviews_rating_created_at_id ON reviews(rating, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reviews_consultant_id_rating_created_at_id ON reviews(consultant_id, rating, created_at, id);
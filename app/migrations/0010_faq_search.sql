@@ -0,0 +1,11 @@
+-- Full-text search over FAQs. The tsvector is generated from the question
+-- (weight A) and the answer (weight B) and kept in a GIN index, so a
+-- search only touches matching rows.
+
+ALTER TABLE faqs ADD COLUMN IF NOT EXISTS search tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', question), 'A') ||
+        setweight(to_tsvector('english', answer), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_faqs_search ON faqs USING GIN (search);
@@ -0,0 +1,68 @@
+-- A change counter per table behind a cacheable page, so a page can tell
+-- whether its data changed without reading that data. The counters are
+-- sequences: nextval() takes no lock that lasts until commit, so writers
+-- to the same table do not queue behind a shared counter.
+--
+-- A write bumps its table's counter twice. The deferred row-level trigger
+-- bumps right before commit, which covers every writer; statements that
+-- change nothing do not bump. A reader between that bump and the commit
+-- pairs the new counter with the old data, so the app bumps again with
+-- bump_committed_versions() once its commit is visible.
+
+CREATE SEQUENCE IF NOT EXISTS users_version_seq;
+CREATE SEQUENCE IF NOT EXISTS bookings_version_seq;
+CREATE SEQUENCE IF NOT EXISTS reviews_version_seq;
+CREATE SEQUENCE IF NOT EXISTS faqs_version_seq;
+
+-- bumps <table>_version_seq in the table's own schema and remembers it in
+-- app.pending_versions; the setting is per session, a rollback undoes it
+CREATE OR REPLACE FUNCTION bump_table_version()
+RETURNS trigger AS $$
+DECLARE
+    seq TEXT := quote_ident(TG_TABLE_SCHEMA) || '.' || quote_ident(TG_TABLE_NAME || '_version_seq');
+    pending TEXT := coalesce(current_setting('app.pending_versions', true), '');
+BEGIN
+    PERFORM nextval(seq::regclass);
+    IF NOT seq = ANY (string_to_array(pending, ' ')) THEN
+        PERFORM set_config('app.pending_versions', ltrim(pending || ' ' || seq), false);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- second bump of every counter the session's committed writes touched
+CREATE OR REPLACE FUNCTION bump_committed_versions()
+RETURNS void AS $$
+DECLARE
+    seq TEXT;
+BEGIN
+    FOREACH seq IN ARRAY string_to_array(coalesce(current_setting('app.pending_versions', true), ''), ' ') LOOP
+        PERFORM nextval(seq::regclass);
+    END LOOP;
+    PERFORM set_config('app.pending_versions', '', false);
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_version ON users;
+CREATE CONSTRAINT TRIGGER users_version
+AFTER INSERT OR UPDATE OR DELETE ON users
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION bump_table_version();
+
+DROP TRIGGER IF EXISTS bookings_version ON bookings;
+CREATE CONSTRAINT TRIGGER bookings_version
+AFTER INSERT OR UPDATE OR DELETE ON bookings
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION bump_table_version();
+
+DROP TRIGGER IF EXISTS reviews_version ON reviews;
+CREATE CONSTRAINT TRIGGER reviews_version
+AFTER INSERT OR UPDATE OR DELETE ON reviews
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION bump_table_version();
+
+DROP TRIGGER IF EXISTS faqs_version ON faqs;
+CREATE CONSTRAINT TRIGGER faqs_version
+AFTER INSERT OR UPDATE OR DELETE ON faqs
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION bump_table_version();
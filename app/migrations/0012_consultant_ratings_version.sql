@@ -0,0 +1,11 @@
+-- The reviews page ranks consultants from consultant_ratings, which a
+-- rebuild can change without touching reviews, so it gets a change
+-- counter of its own.
+
+CREATE SEQUENCE IF NOT EXISTS consultant_ratings_version_seq;
+
+DROP TRIGGER IF EXISTS consultant_ratings_version ON consultant_ratings;
+CREATE CONSTRAINT TRIGGER consultant_ratings_version
+AFTER INSERT OR UPDATE OR DELETE ON consultant_ratings
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION bump_table_version();
@@ -0,0 +1,13 @@
+-- Progress of approve-all runs. A run works in the background and
+-- updates its row after every committed batch, so any worker can show
+-- the admin how far it got.
+
+CREATE TABLE IF NOT EXISTS approve_jobs (
+    id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    started_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    finished_at TIMESTAMPTZ,
+    requests INT NOT NULL DEFAULT 0,
+    credits BIGINT NOT NULL DEFAULT 0,
+    batches INT NOT NULL DEFAULT 0,
+    error TEXT
+);
@@ -0,0 +1,136 @@
+# models/auth.py
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import bcrypt
+import os
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+
+hash_params = {
+    "workers": int(os.getenv('HASH_WORKERS', os.cpu_count() or 1)),
+    # hashes running or waiting for a worker, past that callers get HashBusy
+    "max_pending": int(os.getenv('HASH_MAX_PENDING', 2 * (os.cpu_count() or 1))),
+    "timeout": float(os.getenv('HASH_TIMEOUT', 5)),
+}
+
+
+class HashBusy(Exception):
+    """The hashing pool is saturated, the caller should answer 503."""
+
+
+# Worker side: bcrypt runs in these, off the request threads
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _check(password, hashed, rounds):
+    """Returns (valid, new hash or None), rehashing when the cost changed."""
+    if not bcrypt.checkpw(password, hashed):
+        return False, None
+    if get_rounds(hashed) != rounds:
+        return True, bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+    return True, None
+
+def get_rounds(hashed):
+    # $2b$<rounds>$<salt and hash>
+    return int(hashed.split(b"$")[2])
+
+
+class HashPool:
+    """
+    Process pool for bcrypt with a bounded number of pending jobs, so a
+    burst of logins queues up to max_pending and is then turned away
+    instead of piling up behind the CPU.
+    """
+
+    def __init__(self, workers, max_pending, timeout):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pid = os.getpid()
+        self.broken = False
+        # forkserver: workers do not inherit the threads and sockets of the app
+        self._executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('forkserver'))
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {"jobs": 0, "rejected": 0, "timeouts": 0}
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise HashBusy()
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._slots.release()
+            self.broken = True
+            raise HashBusy()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._pending += 1
+            self._stats["jobs"] += 1
+        # the slot is held until the job is done, even if the caller gave up
+        future.add_done_callback(self._release)
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self._stats["timeouts"] += 1
+            raise HashBusy()
+        except BrokenProcessPool:
+            # a worker died, the next call starts a fresh pool
+            self.broken = True
+            raise HashBusy()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self._pending,
+                **self._stats,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_hash_pool():
+    global _pool
+    if _pool is None or _pool.pid != os.getpid() or _pool.broken:
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid() or _pool.broken:
+                _pool = HashPool(**hash_params)
+    return _pool
+
+def get_hash_stats():
+    if _pool is None:
+        return None
+    return _pool.stats()
+
+def hash_password(password):
+    """bcrypt hash of password at BCRYPT_ROUNDS, raises HashBusy when saturated."""
+    return get_hash_pool().run(_hash, password.encode('utf-8'), BCRYPT_ROUNDS).decode('utf-8')
+
+def check_password(password, hashed):
+    """
+    Returns (valid, new hash or None). A new hash is returned when the
+    stored one was made with a different BCRYPT_ROUNDS and should
+    replace it. Raises HashBusy when saturated.
+    """
+    valid, new_hash = get_hash_pool().run(_check, password.encode('utf-8'), hashed.encode('utf-8'), BCRYPT_ROUNDS)
+    return valid, new_hash.decode('utf-8') if new_hash else None
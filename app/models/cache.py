@@ -0,0 +1,89 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache whose entries also expire
+    ttl seconds after they were stored.
+
+    With maxbytes set, values must support len() (e.g. bytes) and least
+    recently used entries are also evicted while their total length is
+    over maxbytes.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, maxbytes=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    def _size(self, value):
+        return len(value) if self.maxbytes is not None else 0
+
+    def _remove(self, key):
+        entry = self._data.pop(key)
+        self._bytes -= self._size(entry[1])
+        return entry
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        size = self._size(value)
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._bytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self._bytes > self.maxbytes):
+                self._remove(next(iter(self._data)))
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._remove(key) if key in self._data else None
+        return entry[1] if entry else None
+
+    def pop_matching(self, predicate):
+        """Drop every entry whose key satisfies predicate, returns how many."""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+            if self.maxbytes is not None:
+                stats["bytes"] = self._bytes
+                stats["maxbytes"] = self.maxbytes
+            return stats
@@ -1,6 +1,43 @@
 # models/chat.py
-from models.db import execute, get_one, get_all
+from models.db import execute, get_one, get_all, on_commit, PreparedStatement
+from models.cache import TTLCache
+from models.notify import subscribe, notify
+from models.messages import MESSAGE_SETTLE
 import psycopg2
+import os
+import threading
+
+CHAT_MEMBERS = PreparedStatement("chat_members", """
+    SELECT user_id, consultant_id
+    FROM chat WHERE id = $1
+""")
+
+# chat_id -> members; members never change while a chat exists, deletions
+# are broadcast on chat_invalidate so every worker process drops the entry.
+# Paths that delete data re-check the chat on the primary, the TTL only
+# bounds how long a missed deletion lets a member read or send.
+members_cache = TTLCache(
+    maxsize=int(os.getenv('CHAT_MEMBERS_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('CHAT_MEMBERS_CACHE_TTL', 60))
+)
+_members_pid = None
+_members_lock = threading.Lock()
+
+def _on_chat_invalidate(payload):
+    members_cache.pop(int(payload))
+
+def listen_chat_invalidate():
+    """Subscribe this process to chat deletions, once per process."""
+    global _members_pid
+    with _members_lock:
+        if _members_pid != os.getpid():
+            # deletions missed while not listening can't be replayed
+            subscribe("chat_invalidate", _on_chat_invalidate, resync=members_cache.clear)
+            _members_pid = os.getpid()
+
+def invalidate_chat_members(chat_id):
+    on_commit(lambda: members_cache.pop(chat_id))
+    notify("chat_invalidate", str(chat_id))
 
 def create_chat(user_id, consultant_id):
     try:
@@ -23,6 +60,7 @@ def delete_chat(chat_id):
         execute("""
             DELETE FROM chat WHERE id = %s
         """, (chat_id,))
+        invalidate_chat_members(chat_id)
         return None
 
     except Exception as e:
@@ -42,6 +80,41 @@ def get_chat(chat_id):
         return None
 
 
+def get_chat_members(chat_id):
+    members = members_cache.get(chat_id)
+    if members is not None:
+        return dict(members)
+
+    # from the primary: a replica may still have a chat whose deletion
+    # was just broadcast, and it would be cached again for the TTL
+    members = get_one(CHAT_MEMBERS, (chat_id,))
+    if members:
+        listen_chat_invalidate()
+        members_cache.set(chat_id, members)
+    return members
+
+
+def get_chat_state(chat_id, day, hour, readonly=True):
+    """
+    Everything a chat sync needs in one round-trip: the members, who
+    the consultant has booked in the given slot, the newest message id
+    and whether a message is still inside the settle window.
+    """
+    return get_one(f"""
+        SELECT c.user_id, c.consultant_id,
+               b.user_id AS booked_user,
+               (SELECT max(m.id) FROM messages m WHERE m.chat_id = c.id) AS last_message_id,
+               EXISTS (SELECT 1 FROM messages m
+                       WHERE m.chat_id = c.id
+                         AND m.sent_at > now() - interval '{MESSAGE_SETTLE} seconds') AS recent
+        FROM chat c
+        LEFT JOIN bookings b
+               ON b.consultant_id = c.consultant_id
+              AND b.slot_date = current_date + %s - 1 AND b.hour = %s
+        WHERE c.id = %s
+    """, (day, hour, chat_id), readonly=readonly)
+
+
 def get_or_create_chat(user_id, consultant_id):
     try:
         chat = get_one("""
@@ -64,6 +137,8 @@ def get_or_create_chat(user_id, consultant_id):
             WHERE user_id = %s AND consultant_id = %s
         """, (user_id, consultant_id))
 
+        # ids are never reused, but make sure no stale entry survives
+        members_cache.pop(new_chat["id"])
         return new_chat["id"]
 
     except Exception as e:
@@ -74,50 +149,29 @@ def get_chat_pair(day, hour, user_id, role):
     if not (1 <= day <= 3 and 1 <= hour <= 8):
         return None
 
-    # ---------- Consultant: check only his array ----------
+    # ---------- Consultant: booked slot / User: the booking they hold ----------
     if role == "consultant":
-        row = get_one("""
-            SELECT timetable[%s][%s] AS booked_user
-            FROM users
-            WHERE id = %s AND role = 'consultant'
-        """, (day, hour, user_id))
-
-        if not row or row["booked_user"] is None:
-            return None  # no meeting booked
-
-        booked_user_id = row["booked_user"]
-
-        user = get_one("SELECT id, username FROM users WHERE id = %s", (booked_user_id,))
-        consultant = get_one("SELECT id, username FROM users WHERE id = %s", (user_id,))
-
-        if not user or not consultant:
-            return None
-
-        return {"user": user, "consultant": consultant}
-
-    # ---------- User: search all consultant timetables ----------
+        condition = "b.consultant_id = %s"
     elif role == "user":
-        row = get_one("""
-            SELECT id AS consultant_id
-            FROM users
-            WHERE role = 'consultant'
-            AND timetable[%s][%s] = %s
-            LIMIT 1
-        """, (day, hour, user_id))
-
-        if not row:
-            return None
-
-        consultant_id = row["consultant_id"]
-
-        user = get_one("SELECT id, username FROM users WHERE id = %s", (user_id,))
-        consultant = get_one("SELECT id, username FROM users WHERE id = %s", (consultant_id,))
-
-        if not user or not consultant:
-            return None
-
-        return {"user": user, "consultant": consultant}
-
-    # Unknown role → reject
-    return None
+        condition = "b.user_id = %s"
+    else:
+        # Unknown role → reject
+        return None
 
+    row = get_one(f"""
+        SELECT u.id AS user_id, u.username AS user_name,
+               c.id AS consultant_id, c.username AS consultant_name
+        FROM bookings b
+        JOIN users u ON u.id = b.user_id
+        JOIN users c ON c.id = b.consultant_id
+        WHERE {condition} AND b.slot_date = current_date + %s - 1 AND b.hour = %s
+        LIMIT 1
+    """, (user_id, day, hour))
+
+    if not row:
+        return None  # no meeting booked
+
+    return {
+        "user": {"id": row["user_id"], "username": row["user_name"]},
+        "consultant": {"id": row["consultant_id"], "username": row["consultant_name"]},
+    }
@@ -1,7 +1,12 @@
-# models/db.py
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+from contextlib import contextmanager
+from flask import g, has_app_context, has_request_context, request, session
+import logging
+import threading
+import time
 import os
-import sys
 
 db_params = {
     'dbname': os.getenv('PGDATABASE', 'smartphonesioi'),
@@ -11,19 +16,562 @@ db_params = {
     'port': os.getenv('PGPORT', 5432)
 }
 
+pool_params = {
+    'minconn': int(os.getenv('PGPOOL_MIN', 1)),
+    'maxconn': int(os.getenv('PGPOOL_MAX', 10)),
+    'timeout': float(os.getenv('PGPOOL_TIMEOUT', 5)),        # seconds to wait for a free connection
+    'max_uses': int(os.getenv('PGPOOL_MAX_USES', 1000)),     # recycle a connection after N checkouts
+    'check_idle': float(os.getenv('PGPOOL_CHECK_IDLE', 30)), # ping connections idle longer than this
+}
+
+ITERSIZE = int(os.getenv('PG_ITERSIZE', 500))   # rows fetched per round-trip by iter_all()
+
+# read-only queries go to these hosts ("host:port,host:port"), same credentials as the primary
+replica_hosts = [h.strip() for h in os.getenv('PGREPLICA_HOSTS', '').split(',') if h.strip()]
+REPLICA_RETRY = float(os.getenv('PGREPLICA_RETRY', 30))              # seconds a failed replica is skipped
+READ_YOUR_WRITES = float(os.getenv('PG_READ_YOUR_WRITES', 5))       # seconds a session reads from the primary after writing
+
+SLOW_QUERY_MS = float(os.getenv('PG_SLOW_QUERY_MS', 100))
+QUERY_STATS_MAX = int(os.getenv('PG_QUERY_STATS_MAX', 500))   # distinct (endpoint, statement) pairs kept
+
+logger = logging.getLogger(__name__)
+
+_query_stats = {}
+_query_stats_lock = threading.Lock()
+
+
+def fingerprint(query):
+    # queries are parameterised, so the collapsed template identifies the statement
+    return " ".join(query.split())
+
+def record_query(query, duration, rows):
+    endpoint = request.endpoint if has_request_context() else None
+    statement = fingerprint(query)
+
+    if has_app_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_time = g.get('db_time', 0.0) + duration
+
+    if duration * 1000 >= SLOW_QUERY_MS:
+        logger.warning("Slow query (%.1f ms, %s rows, endpoint %s): %s",
+                       duration * 1000, rows, endpoint, statement)
+
+    key = (endpoint, statement)
+    with _query_stats_lock:
+        stats = _query_stats.get(key)
+        if stats is None:
+            if len(_query_stats) >= QUERY_STATS_MAX:
+                return
+            stats = _query_stats[key] = {"count": 0, "total": 0.0, "max": 0.0, "rows": 0}
+        stats["count"] += 1
+        stats["total"] += duration
+        stats["max"] = max(stats["max"], duration)
+        if rows > 0:
+            stats["rows"] += rows
+
+def get_query_stats(limit=20):
+    with _query_stats_lock:
+        items = [(key, dict(stats)) for key, stats in _query_stats.items()]
+
+    items.sort(key=lambda item: item[1]["total"], reverse=True)
+    return [{
+        "endpoint": endpoint,
+        "statement": statement,
+        "count": stats["count"],
+        "rows": stats["rows"],
+        "total_ms": round(stats["total"] * 1000, 3),
+        "mean_ms": round(stats["total"] * 1000 / stats["count"], 3),
+        "max_ms": round(stats["max"] * 1000, 3),
+    } for (endpoint, statement), stats in items[:limit]]
+
+def add_server_timing(response):
+    if g.get('db_queries'):
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={g.db_time * 1000:.1f};desc="{g.db_queries} queries"'
+        )
+    return response
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Cursor that times every statement it sends."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, time.perf_counter() - start, self.rowcount)
+
+
+class PoolTimeout(psycopg2.pool.PoolError):
+    pass
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that keeps track of its pool bookkeeping."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = InstrumentedCursor
+        self.pool = None
+        self.prepared = set()
+        self.uses = 0
+        self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """
+    Thread-safe connection pool with a bounded size, an acquire timeout,
+    a health check on checkout and recycling after max_uses checkouts.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, max_uses, check_idle, **params):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.check_idle = check_idle
+        self.params = params
+        self.pid = os.getpid()
+
+        self._cond = threading.Condition()
+        self._idle = []
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "failed_checks": 0,
+        }
+
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(connection_factory=PooledConnection, **self.params)
+        conn.pool = self
+        with self._cond:
+            self._stats["created"] += 1
+        return conn
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - conn.last_used < self.check_idle:
+            return True
+        try:
+            # autocommit so the ping does not leave a transaction open
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.autocommit = False
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        conn = None
+
+        with self._cond:
+            waited = False
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s.")
+
+                waited = True
+                self._waiting += 1
+                self._cond.wait(remaining)
+                self._waiting -= 1
+
+            self._in_use += 1
+            self._stats["checkouts"] += 1
+            if waited:
+                wait_time = time.monotonic() - start
+                self._stats["waits"] += 1
+                self._stats["wait_time_total"] += wait_time
+                self._stats["wait_time_max"] = max(self._stats["wait_time_max"], wait_time)
+
+        try:
+            if conn is not None and not self._is_healthy(conn):
+                with self._cond:
+                    self._stats["failed_checks"] += 1
+                self._close(conn)
+                conn = None
+
+            if conn is None:
+                conn = self._connect()
+
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        conn.uses += 1
+        return conn
+
+    def putconn(self, conn, close=False):
+        if not conn.closed and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        recycle = (
+            close
+            or conn.closed
+            or os.getpid() != self.pid
+            or (self.max_uses and conn.uses >= self.max_uses)
+        )
+
+        if recycle:
+            self._close(conn)
+
+        with self._cond:
+            self._in_use -= 1
+            if recycle:
+                self._size -= 1
+                self._stats["recycled"] += 1
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def _close(self, conn):
+        # never close a connection inherited from the parent process,
+        # that would terminate the parent's session on the shared socket
+        if os.getpid() != self.pid:
+            return
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self._size,
+                "max_size": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+            })
+        stats["wait_time_avg"] = stats["wait_time_total"] / stats["waits"] if stats["waits"] else 0.0
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    # a forked worker must not share the parent's sockets
+    if _pool is None or _pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool(**pool_params, **db_params)
+    return _pool
+
+def get_pool_stats():
+    if _pool is None:
+        return {}
+    return _pool.stats()
+
 def get_db_connection():
-    return psycopg2.connect(**db_params)
+    """Primary connection for an explicit transaction, counts as a write."""
+    mark_write()
+    return get_pool().getconn()
+
+def release_db_connection(conn, close=False):
+    conn.pool.putconn(conn, close)
+
+
+class ReplicaSet:
+    """
+    Round-robin over the read replicas. A replica whose checkout fails
+    is skipped for REPLICA_RETRY seconds, with every replica down the
+    caller falls back to the primary.
+    """
+
+    def __init__(self, hosts):
+        self.pid = os.getpid()
+        self.hosts = hosts
+        self._next = 0
+        self._down_until = [0.0] * len(hosts)
+        self._lock = threading.Lock()
+        self._pools = [None] * len(hosts)
+
+    def _pool(self, i):
+        if self._pools[i] is None:
+            host, _, port = self.hosts[i].partition(':')
+            params = dict(db_params, host=host, port=port or db_params['port'])
+            self._pools[i] = ConnectionPool(**pool_params, **params)
+        return self._pools[i]
+
+    def getconn(self):
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.hosts)
+
+        now = time.monotonic()
+        for offset in range(len(self.hosts)):
+            i = (start + offset) % len(self.hosts)
+            if self._down_until[i] > now:
+                continue
+            try:
+                with self._lock:
+                    pool = self._pool(i)
+                return pool.getconn()
+            except PoolTimeout:
+                # busy rather than broken, try the next one
+                continue
+            except psycopg2.OperationalError as e:
+                logger.warning("Replica %s unavailable: %s", self.hosts[i], e)
+                self._down_until[i] = now + REPLICA_RETRY
+        return None
 
-def execute(query, values=()):
-    conn = None
+    def stats(self):
+        now = time.monotonic()
+        return [{
+            "host": host,
+            "up": self._down_until[i] <= now,
+            "pool": self._pools[i].stats() if self._pools[i] else {},
+        } for i, host in enumerate(self.hosts)]
+
+
+_replicas = None
+
+def get_replicas():
+    global _replicas
+    if not replica_hosts:
+        return None
+    if _replicas is None or _replicas.pid != os.getpid():
+        with _pool_lock:
+            if _replicas is None or _replicas.pid != os.getpid():
+                _replicas = ReplicaSet(replica_hosts)
+    return _replicas
+
+def get_replica_stats():
+    if _replicas is None:
+        return []
+    return _replicas.stats()
+
+class RequestFailed(Exception):
+    """A statement of this request failed, its writes were rolled back."""
+
+def mark_write():
+    if has_app_context():
+        # the request's earlier writes are gone, later ones must not
+        # commit without them
+        if g.get('db_failed'):
+            raise RequestFailed("An earlier statement of this request failed.")
+        g.db_wrote = True
+
+def is_write(query):
+    if isinstance(query, PreparedStatement):
+        return False
+    return query.lstrip().split(None, 1)[0].upper() != 'SELECT'
+
+def get_replica_connection():
+    """
+    Connection to a read replica, or None when the primary has to answer:
+    no replicas configured or reachable, the request already wrote or
+    asked for the primary, or the session wrote less than
+    READ_YOUR_WRITES seconds ago.
+    """
+    replicas = get_replicas()
+    if replicas is None:
+        return None
+    if has_app_context() and (g.get('db_wrote') or g.get('db_primary')):
+        return None
+    if has_request_context() and session.get('db_write_at', 0) + READ_YOUR_WRITES > time.time():
+        return None
+    return replicas.getconn()
+
+def use_primary():
+    """Send the rest of the request's readonly reads to the primary."""
+    if has_app_context():
+        g.db_primary = True
+
+class PreparedStatement:
+    """
+    Named statement that is PREPAREd once per connection and then only
+    EXECUTEd. The query uses PostgreSQL's $1, $2, ... placeholders and
+    can be passed to execute(), get_one() and get_all() instead of SQL.
+    """
+
+    def __init__(self, name, query):
+        if name in PREPARED_STATEMENTS:
+            raise ValueError(f"Prepared statement {name} is already registered.")
+        self.name = name
+        self.query = query
+        PREPARED_STATEMENTS[name] = self
+
+    def __repr__(self):
+        return f"<PreparedStatement {self.name}>"
+
+PREPARED_STATEMENTS = {}
+
+def run_statement(cur, query, values=()):
+    if not isinstance(query, PreparedStatement):
+        cur.execute(query, values)
+        return
+
+    # only PooledConnection keeps track of what it has prepared
+    prepared = cur.connection.prepared
+    if query.name not in prepared:
+        # PREPARE is not transactional, once it succeeded the statement
+        # lives as long as the session even if the transaction rolls back
+        cur.execute(f"PREPARE {query.name} AS {query.query}")
+        prepared.add(query.name)
+
+    if values:
+        placeholders = ", ".join(["%s"] * len(values))
+        cur.execute(f"EXECUTE {query.name} ({placeholders})", values)
+    else:
+        cur.execute(f"EXECUTE {query.name}")
+
+def get_request_connection():
+    """
+    Connection shared by every model call of the current request.
+
+    It is checked out lazily on first use, committed once by
+    commit_request_connection() and returned to the pool by
+    close_request_connection(). Once a statement fails the whole unit
+    of work is rolled back, later writes raise RequestFailed and nothing
+    is committed. Outside of a Flask app context there is no unit of
+    work and None is returned.
+    """
+    if not has_app_context():
+        return None
+    conn = g.get('db_conn')
+    if conn is not None and conn.closed:
+        release_db_connection(conn)
+        conn = None
+    if conn is None:
+        conn = g.db_conn = get_pool().getconn()
+    return conn
+
+def on_commit(callback):
+    """
+    Run callback once the current request's transaction has committed,
+    or right away outside of a request. Used to invalidate caches only
+    after the new data is visible to other connections.
+    """
+    if has_app_context() and g.get('db_conn') is not None:
+        g.setdefault('db_on_commit', []).append(callback)
+    else:
+        callback()
+
+def commit_request_connection(response):
+    # after_request also runs for the 500 of an unhandled exception,
+    # close_request_connection() rolls those back
+    if g.get('db_failed') or (response is not None and response.status_code >= 500):
+        g.pop('db_on_commit', None)
+        return response
+
+    conn = g.get('db_conn')
+    if conn is not None and not conn.closed:
+        start = time.perf_counter()
+        conn.commit()
+        if g.get('db_wrote'):
+            bump_committed_versions(conn)
+        g.db_time = g.get('db_time', 0.0) + time.perf_counter() - start
+    for callback in g.pop('db_on_commit', []):
+        callback()
+    if g.get('db_wrote') and has_request_context():
+        # read-your-writes: keep this session on the primary for a while
+        session['db_write_at'] = time.time()
+    return response
+
+def bump_committed_versions(conn):
+    """
+    Bump the change counters of the tables conn's committed writes
+    touched, now that the new rows are visible (see 0011_table_versions).
+    """
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT bump_committed_versions()")
+        conn.commit()
+    except psycopg2.Error as e:
+        print(f"Error bumping table versions: {e}")
+        conn.rollback()
+
+def close_request_connection(exc=None):
+    conn = g.pop('db_conn', None)
+    if conn is None:
+        return
+    # anything still uncommitted here belongs to a failed request,
+    # putconn() rolls it back before the connection is reused
+    release_db_connection(conn)
+
+def end_request_transaction():
+    """
+    Commit the current request's work and return its connection to the
+    pool now instead of at the end of the request, before a slow step
+    that does not need the database. Model calls made afterwards check
+    out a fresh connection.
+    """
+    if not has_app_context():
+        return
+    commit_request_connection(None)
+    close_request_connection()
+
+@contextmanager
+def cursor(readonly=False):
+    replica = get_replica_connection() if readonly else None
+    conn = None if replica else get_request_connection()
+
+    if conn is not None:
+        cur = conn.cursor()
+        try:
+            yield cur
+        except Exception:
+            # the request's unit of work is lost: later reads start a
+            # fresh transaction, later writes are refused
+            if not conn.closed:
+                conn.rollback()
+            g.db_failed = True
+            g.pop('db_on_commit', None)
+            raise
+        finally:
+            cur.close()
+        return
+
+    conn = replica
     cur = None
     try:
-        conn = get_db_connection()
+        if conn is None:
+            conn = get_pool().getconn()
         cur = conn.cursor()
-        cur.execute(query, values)
+        yield cur
         conn.commit()
 
-    except Exception as e:
+    except Exception:
         if conn:
             conn.rollback()
         raise
@@ -32,195 +580,76 @@ def execute(query, values=()):
         if cur:
             cur.close()
         if conn:
-            conn.close()
+            release_db_connection(conn)
 
-def get_one(query, values=()):
-    conn = None
-    cur = None
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(query, values)
+def execute(query, values=()):
+    mark_write()
+    with cursor() as cur:
+        run_statement(cur, query, values)
+
+def get_one(query, values=(), readonly=False):
+    if not readonly and is_write(query):
+        mark_write()
+    with cursor(readonly) as cur:
+        run_statement(cur, query, values)
         data = cur.fetchone()
-        conn.commit()
         if data:
             columns = [desc[0] for desc in cur.description]
             data_dict = dict(zip(columns, data))
             return data_dict
         return None
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        raise
 
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
-
-def get_all(query, values=()):
-    conn = None
-    cur = None
-    try:
-        conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute(query, values)
+def get_all(query, values=(), readonly=False):
+    if not readonly and is_write(query):
+        mark_write()
+    with cursor(readonly) as cur:
+        run_statement(cur, query, values)
         data = cur.fetchall()
-        conn.commit()
         if data:
             columns = [desc[0] for desc in cur.description]
             data_dict = [dict(zip(columns, i)) for i in data]
             return data_dict
         return []
 
-    except Exception as e:
-        if conn:
-            conn.rollback()
-        raise
-
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+def iter_all(query, values=(), itersize=None, readonly=False):
+    """
+    Generator version of get_all() backed by a named server-side cursor,
+    rows are fetched itersize at a time instead of all at once.
 
-def init_db():
+    It checks out its own connection instead of the request's, so it can
+    be consumed while a streamed response is sent after the request's
+    transaction has been committed.
+    """
     conn = None
     cur = None
     try:
-        from .users import USER_COLUMN_LENGTHS
+        if readonly:
+            conn = get_replica_connection()
+        if conn is None:
+            conn = get_pool().getconn()
+        cur = conn.cursor(name=f"iter_all_{id(conn)}")
+        cur.itersize = itersize or ITERSIZE
+        cur.execute(query, values)
 
-        conn = get_db_connection()
-        conn.autocommit = True
-        cur = conn.cursor()
+        columns = None
+        for row in cur:
+            if columns is None:
+                columns = [desc[0] for desc in cur.description]
+            yield dict(zip(columns, row))
 
-        cur.execute("""
-            CREATE SCHEMA IF NOT EXISTS smartphonesioi;
-            ALTER DATABASE smartphonesioi
-                SET search_path = smartphonesioi, public;
-            SET search_path TO smartphonesioi;
-        """)
-
-        cur.execute("""
-            DO $$
-            BEGIN
-                IF NOT EXISTS (SELECT 1 FROM pg_type WHERE typname = 'user_role') THEN
-                    CREATE TYPE user_role AS ENUM ('admin', 'consultant', 'user');
-                END IF;
-            END
-            $$;
-        """)
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-            username VARCHAR(%(username_length)s) UNIQUE NOT NULL,
-            email VARCHAR(30) UNIQUE NOT NULL,
-            password VARCHAR(%(password_length)s) NOT NULL,
-            role user_role NOT NULL DEFAULT 'user',
-            created_at TIMESTAMPTZ DEFAULT now(),
-            timetable INT[3][8] DEFAULT '{{NULL,NULL,NULL,NULL,NULL,NULL,NULL,NULL},
-                                        {NULL,NULL,NULL,NULL,NULL,NULL,NULL,NULL},
-                                        {NULL,NULL,NULL,NULL,NULL,NULL,NULL,NULL}}',
-            credits INT DEFAULT 0 CHECK (credits >= 0)
-        );
-
-        CREATE OR REPLACE FUNCTION shift_consultant_timetables()
-        RETURNS void AS $$
-        BEGIN
-            UPDATE users
-            SET timetable = ARRAY[
-                (SELECT array_agg(x) FROM unnest(timetable[2:2]) AS x),
-                (SELECT array_agg(x) FROM unnest(timetable[3:3]) AS x),
-                array_fill(NULL::int, ARRAY[8])
-            ]
-            WHERE role = 'consultant';
-        END;
-        $$ LANGUAGE plpgsql;
-
-        CREATE EXTENSION IF NOT EXISTS pg_cron;
-
-        SELECT cron.schedule(
-            'shift_timetables_midnight',
-            '0 0 * * *',
-            $$ SELECT shift_consultant_timetables(); $$
-        );
-
-
-        CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
-
-        CREATE TABLE IF NOT EXISTS requests (
-            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-            amount INT NOT NULL,
-            created_at TIMESTAMPTZ DEFAULT now(),
-            user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE
-        );
-
-        CREATE INDEX IF NOT EXISTS idx_requests_user_id ON requests(user_id);
-
-        CREATE TABLE IF NOT EXISTS reviews (
-            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-            review_text TEXT,
-            rating INT NOT NULL CHECK (rating BETWEEN 1 AND 5),
-            created_at TIMESTAMPTZ DEFAULT now(),
-            user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-            consultant_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE
-        );
-
-        CREATE TABLE IF NOT EXISTS chat (
-            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-            user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-            consultant_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-            created_at TIMESTAMPTZ DEFAULT now(),
-            UNIQUE (user_id, consultant_id)
-        );
-
-        CREATE INDEX IF NOT EXISTS idx_chat_user_id ON chat(user_id);
-        CREATE INDEX IF NOT EXISTS idx_chat_consultant_id ON chat(consultant_id);
-
-        CREATE TABLE IF NOT EXISTS messages (
-            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-            sender_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-            message TEXT NOT NULL CHECK (length(trim(message)) > 0),
-            sent_at TIMESTAMPTZ DEFAULT now(),
-            chat_id INT NOT NULL REFERENCES chat(id) ON DELETE CASCADE
-        );
-
-        CREATE INDEX IF NOT EXISTS idx_messages_chat_id ON messages(chat_id);
-        CREATE INDEX IF NOT EXISTS idx_messages_sent_at ON messages(sent_at DESC);
-
-        CREATE TABLE IF NOT EXISTS can_review (
-            user_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-            consultant_id INT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-            PRIMARY KEY (user_id, consultant_id)
-        );
-
-        CREATE TABLE IF NOT EXISTS faqs (
-            id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
-            question TEXT NOT NULL CHECK (length(trim(question)) > 0),
-            answer TEXT NOT NULL CHECK (length(trim(answer)) > 0),
-            created_at TIMESTAMPTZ DEFAULT now()
-        );
-
-        INSERT INTO users (username, email, password, role, credits)
-        VALUES ('admin', 'admin@t.com', '$2b$12$VEUlGiag6gJv.S6i51/i3Ov00lICVZsK37xVwA/1wC5KBVvJItgUK', 'admin', 0)
-        ON CONFLICT (username) DO NOTHING;
-        """, {
-            'username_length': USER_COLUMN_LENGTHS['username'][1],
-            'password_length': USER_COLUMN_LENGTHS['password'][1],
-        })
-
-        print("Database initialized successfully!")
-
-    except Exception as e:
-        print(f"Error occurred: {e}")
+        conn.commit()
+
+    except Exception:
         if conn:
-            conn.close()
-        sys.exit(1)
+            conn.rollback()
+        raise
 
     finally:
         if cur:
             cur.close()
         if conn:
-            conn.close()
+            release_db_connection(conn)
+
+def init_db():
+    from .migrations import migrate
+    migrate()
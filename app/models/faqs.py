@@ -1,7 +1,19 @@
 # models/faq.py
 from models.db import execute, get_one, get_all
+from models.pages import invalidate_pages
+from markupsafe import Markup, escape
 from datetime import datetime
 import psycopg2
+import os
+
+FAQ_SEARCH_PAGE_SIZE = int(os.getenv('FAQ_SEARCH_PAGE_SIZE', 10))
+
+# ts_headline marks matches with these control characters instead of
+# tags, so the snippet can be HTML-escaped before they become <mark>
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+QUESTION_HEADLINE = f"StartSel={MATCH_START}, StopSel={MATCH_END}, HighlightAll=true"
+ANSWER_HEADLINE = f"StartSel={MATCH_START}, StopSel={MATCH_END}, MaxWords=35, MinWords=15, MaxFragments=2"
 
 def get_faqs():
     try:
@@ -9,19 +21,55 @@ def get_faqs():
             SELECT id, question, answer, created_at
             FROM faqs
             ORDER BY created_at DESC
-        """)
+        """, readonly=True)
         return faqs
     except Exception as e:
         print(f"Error fetching FAQs: {e}")
         return "Error fetching FAQs."
 
 
+def highlight(headline):
+    """Escape a ts_headline snippet and turn its match markers into <mark>."""
+    text = str(escape(headline))
+    return Markup(text.replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>"))
+
+def search_faqs(query, page=1, limit=FAQ_SEARCH_PAGE_SIZE):
+    """
+    Ranked FAQ search for a web-style query ("quoted phrases", or, -not).
+    Only the rows of the requested page get headlines, returns
+    {"rows": [...], "next": bool}.
+    """
+    try:
+        rows = get_all("""
+            SELECT f.id, f.created_at,
+                   ts_headline('english', f.question, f.q, %s) AS question,
+                   ts_headline('english', f.answer, f.q, %s) AS answer
+            FROM (
+                SELECT id, question, answer, created_at, q,
+                       ts_rank(search, q) AS rank
+                FROM faqs, websearch_to_tsquery('english', %s) q
+                WHERE search @@ q
+                ORDER BY rank DESC, id DESC
+                LIMIT %s OFFSET %s
+            ) f
+            ORDER BY f.rank DESC, f.id DESC
+        """, (QUESTION_HEADLINE, ANSWER_HEADLINE, query, limit + 1, (page - 1) * limit), readonly=True)
+
+        for row in rows:
+            row["question"] = highlight(row["question"])
+            row["answer"] = highlight(row["answer"])
+        return {"rows": rows[:limit], "next": len(rows) > limit}
+    except Exception as e:
+        print(f"Error searching FAQs: {e}")
+        return "Error searching FAQs."
+
 def create_faq(question, answer):
     try:
         execute("""
             INSERT INTO faqs (question, answer)
             VALUES (%s, %s)
         """, (question, answer))
+        invalidate_pages('faq')
     except psycopg2.errors.CheckViolation:
         return "Question and answer cannot be empty."
 
@@ -39,6 +87,7 @@ def delete_faq(faq_id):
             DELETE FROM faqs
             WHERE id = %s
         """, (faq_id,))
+        invalidate_pages('faq')
     except Exception as e:
         print(f"Error deleting FAQ: {e}")
         return "Error deleting FAQ."
@@ -1,6 +1,33 @@
 # models/messages.py
-from models.db import execute, get_one, get_all
+from models.db import execute, get_one, get_all, PreparedStatement
+from models.notify import subscribe
+from collections import defaultdict
 import psycopg2
+import queue
+import threading
+import os
+
+# Ids are taken at insert but become visible at commit, so a lower id can
+# show up after a higher one was read. Reads after a cursor therefore also
+# return the messages of the last MESSAGE_SETTLE seconds and the reader
+# drops the ids it already has.
+MESSAGE_SETTLE = int(os.getenv('CHAT_MESSAGE_SETTLE', 10))
+
+MESSAGES_AFTER = PreparedStatement("messages_after", f"""
+    SELECT id, message, sent_at,
+    CASE WHEN sender_id = $1 THEN TRUE ELSE FALSE END AS is_mine
+    FROM messages
+    WHERE chat_id = $2
+      AND (id > $3 OR sent_at > now() - interval '{MESSAGE_SETTLE} seconds')
+    ORDER BY id ASC
+""")
+
+MESSAGE_CURSOR = PreparedStatement("message_cursor", f"""
+    SELECT (SELECT max(id) FROM messages WHERE chat_id = $1) AS last_id,
+           EXISTS (SELECT 1 FROM messages
+                   WHERE chat_id = $1
+                     AND sent_at > now() - interval '{MESSAGE_SETTLE} seconds') AS recent
+""")
 
 def send_message(chat_id, message_text):
     if not message_text or message_text.strip() == "":
@@ -21,6 +48,26 @@ def send_message(chat_id, message_text):
         return "Database error sending message."
 
 
+CHAT_ENDED = "This chat has ended."
+
+def add_message(chat_id, sender_id, message_text):
+    """Returns the new message's id and sent_at, or an error string."""
+    try:
+        return get_one("""
+            INSERT INTO messages (message, chat_id, sender_id)
+            VALUES (%s, %s, %s)
+            RETURNING id, sent_at
+        """, (message_text, chat_id, sender_id))
+
+    except psycopg2.errors.ForeignKeyViolation:
+        # the chat was deleted after its members were read
+        return CHAT_ENDED
+
+    except Exception as e:
+        print(f"Error sending message: {e}")
+        return "Database error sending message."
+
+
 def get_messages(chat_id):
     try:
         return get_all("""
@@ -28,15 +75,52 @@ def get_messages(chat_id):
             FROM messages
             WHERE chat_id = %s
             ORDER BY sent_at ASC
-        """, (chat_id,))
+        """, (chat_id,), readonly=True)
     except Exception as e:
         print(f"Error fetching messages: {e}")
         return []
 
-def get_messages_after(chat_id, last_id):
-    return get_all("""
-        SELECT id, message, sent_at, sender_id
-        FROM messages
-        WHERE chat_id = %s AND id > %s
-        ORDER BY id ASC
-    """, (chat_id, last_id))
+def get_messages_after(chat_id, last_id, user_id, readonly=True):
+    return get_all(MESSAGES_AFTER, (user_id, chat_id, last_id), readonly=readonly)
+
+def get_message_cursor(chat_id):
+    """
+    Newest message id of a chat (0 if none) and whether any message is
+    still inside the settle window, i.e. reads after a cursor may change.
+    """
+    row = get_one(MESSAGE_CURSOR, (chat_id,), readonly=True)
+    return row["last_id"] or 0, row["recent"]
+
+
+# ---------------------------------------------------------
+# Push delivery: chat_id -> queues of the open chat streams
+# ---------------------------------------------------------
+_chat_queues = defaultdict(set)
+_chat_queues_lock = threading.Lock()
+_subscribed = False
+
+def _on_new_message(payload):
+    chat_id, _, message_id = payload.partition(":")
+    with _chat_queues_lock:
+        queues = list(_chat_queues.get(int(chat_id), ()))
+    for q in queues:
+        q.put_nowait(int(message_id))
+
+def subscribe_chat(chat_id):
+    """Queue that receives the id of every message committed to chat_id."""
+    global _subscribed
+    q = queue.Queue()
+    with _chat_queues_lock:
+        _chat_queues[chat_id].add(q)
+        if not _subscribed:
+            subscribe("chat_messages", _on_new_message)
+            _subscribed = True
+    return q
+
+def unsubscribe_chat(chat_id, q):
+    with _chat_queues_lock:
+        queues = _chat_queues.get(chat_id)
+        if queues is not None:
+            queues.discard(q)
+            if not queues:
+                del _chat_queues[chat_id]
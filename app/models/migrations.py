@@ -0,0 +1,162 @@
+"""
+Versioned schema migrations.
+
+Migrations are the files in app/migrations named NNNN_description.sql,
+applied in order of their number. Each one runs in its own transaction
+together with the row recording it in schema_migrations. A file whose
+first line is "-- no-transaction" runs statement by statement in
+autocommit mode instead, which is what CREATE INDEX CONCURRENTLY needs.
+
+Workers starting at the same time serialize on an advisory lock, and
+a database that is already current costs a single query. Waiters poll
+for the lock instead of blocking on it: a blocked pg_advisory_lock()
+keeps a snapshot open, and CREATE INDEX CONCURRENTLY in the lock
+holder would wait on that snapshot while the waiter waits on the lock.
+
+A no-transaction migration that failed halfway can leave an INVALID
+index behind, which IF NOT EXISTS would happily accept on the retry,
+so invalid indexes it is about to create are dropped first.
+"""
+import os
+import re
+import sys
+import time
+
+import psycopg2
+
+from models.db import db_params
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+SCHEMA = 'smartphonesioi'
+LOCK_ID = 0x5350_4d49_4752   # arbitrary, shared by every worker
+LOCK_POLL = 0.5              # seconds between attempts to take the lock
+
+_filename = re.compile(r'^(\d+)_(\w+)\.sql$')
+_concurrent_index = re.compile(
+    r'^\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)', re.I | re.M)
+
+
+def get_migrations():
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = _filename.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    migrations.sort()
+    return migrations
+
+
+def get_current_version(cur):
+    try:
+        cur.execute(f"SELECT coalesce(max(version), 0) FROM {SCHEMA}.schema_migrations")
+        return cur.fetchone()[0]
+    except (psycopg2.errors.UndefinedTable, psycopg2.errors.InvalidSchemaName):
+        return 0
+
+
+def split_statements(sql):
+    """Split on semicolons that end a line, enough for -- no-transaction files."""
+    return [s.strip() for s in re.split(r';\s*$', sql, flags=re.M) if s.strip() and not all(
+        line.strip().startswith('--') or not line.strip() for line in s.splitlines())]
+
+
+def drop_invalid_index(cur, name):
+    cur.execute("""
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s AND NOT i.indisvalid
+    """, (SCHEMA, name))
+    if cur.fetchone():
+        print(f"Dropping invalid index {name} left by an interrupted run...")
+        cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {SCHEMA}."{name}"')
+
+
+def acquire_lock(cur):
+    # never block inside pg_advisory_lock(), see the module docstring
+    while True:
+        cur.execute("SELECT pg_try_advisory_lock(%s)", (LOCK_ID,))
+        if cur.fetchone()[0]:
+            return
+        time.sleep(LOCK_POLL)
+
+
+def apply_migration(conn, cur, version, name, path):
+    with open(path) as f:
+        sql = f.read()
+
+    if sql.startswith('-- no-transaction'):
+        for statement in split_statements(sql):
+            match = _concurrent_index.search(statement)
+            if match:
+                drop_invalid_index(cur, match.group(1))
+            cur.execute(statement)
+        cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        return
+
+    conn.autocommit = False
+    try:
+        cur.execute(sql)
+        cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.autocommit = True
+
+
+def migrate():
+    conn = None
+    cur = None
+    try:
+        # migrations run outside the pool, the search_path change only
+        # applies to connections opened after it
+        conn = psycopg2.connect(**db_params)
+        conn.autocommit = True
+        cur = conn.cursor()
+
+        migrations = get_migrations()
+        latest = migrations[-1][0] if migrations else 0
+
+        if get_current_version(cur) >= latest:
+            print("Database schema is up to date.")
+            return
+
+        acquire_lock(cur)
+        try:
+            cur.execute(f"""
+                CREATE SCHEMA IF NOT EXISTS {SCHEMA};
+                SET search_path TO {SCHEMA}, public;
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ DEFAULT now()
+                );
+            """)
+
+            # another worker may have finished while we waited for the lock
+            current = get_current_version(cur)
+            for version, name, path in migrations:
+                if version <= current:
+                    continue
+                print(f"Applying migration {version:04d}_{name}...")
+                apply_migration(conn, cur, version, name, path)
+
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_ID,))
+
+        print("Database migrated successfully!")
+
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        if conn:
+            conn.close()
+        sys.exit(1)
+
+    finally:
+        if cur and not cur.closed:
+            cur.close()
+        if conn and not conn.closed:
+            conn.close()
@@ -0,0 +1,127 @@
+"""
+PostgreSQL LISTEN/NOTIFY fan-out.
+
+Each process keeps a single listening connection to the primary in a
+background thread and hands every notification to the callbacks
+subscribed to its channel. Callbacks run on that thread, so they must
+be quick and must not block.
+
+Notifications sent while a channel is not being listened on, before the
+first LISTEN or while reconnecting, are lost. Subscribers that keep
+state in sync through a channel pass a resync callback, which runs each
+time LISTEN on the channel (re)starts.
+"""
+from collections import defaultdict
+import logging
+import os
+import select
+import threading
+import time
+
+import psycopg2
+
+from models.db import db_params, execute
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 1.0     # seconds between checks for newly subscribed channels
+RECONNECT_DELAY = 2.0
+
+
+class Listener:
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self._callbacks = defaultdict(list)
+        self._resyncs = defaultdict(list)
+        self._listening = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, channel, callback, resync=None):
+        with self._lock:
+            self._callbacks[channel].append(callback)
+            if resync is not None:
+                self._resyncs[channel].append(resync)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="pg-listener", daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self, channel, callback):
+        with self._lock:
+            if callback in self._callbacks.get(channel, ()):
+                self._callbacks[channel].remove(callback)
+
+    def _listen_pending(self, cur):
+        with self._lock:
+            pending = [c for c in self._callbacks if c not in self._listening]
+        for channel in pending:
+            cur.execute(f'LISTEN "{channel}"')
+            self._listening.add(channel)
+            with self._lock:
+                resyncs = list(self._resyncs.get(channel, ()))
+            for resync in resyncs:
+                try:
+                    resync()
+                except Exception as e:
+                    logger.exception("Error resyncing %s: %s", channel, e)
+
+    def _dispatch(self, notify):
+        with self._lock:
+            callbacks = list(self._callbacks.get(notify.channel, ()))
+        for callback in callbacks:
+            try:
+                callback(notify.payload)
+            except Exception as e:
+                logger.exception("Error handling notification on %s: %s", notify.channel, e)
+
+    def _run(self):
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**db_params)
+                conn.autocommit = True
+                self._listening = set()
+
+                with conn.cursor() as cur:
+                    while True:
+                        self._listen_pending(cur)
+                        if select.select([conn], [], [], POLL_INTERVAL) == ([], [], []):
+                            continue
+                        conn.poll()
+                        while conn.notifies:
+                            self._dispatch(conn.notifies.pop(0))
+
+            except psycopg2.Error as e:
+                logger.warning("Notification listener lost its connection: %s", e)
+                time.sleep(RECONNECT_DELAY)
+
+            finally:
+                if conn and not conn.closed:
+                    conn.close()
+
+
+_listener = None
+_listener_lock = threading.Lock()
+
+def get_listener():
+    global _listener
+    if _listener is None or _listener.pid != os.getpid():
+        with _listener_lock:
+            if _listener is None or _listener.pid != os.getpid():
+                _listener = Listener()
+    return _listener
+
+def subscribe(channel, callback, resync=None):
+    """
+    Call callback(payload) for every notification on channel, and
+    resync() whenever notifications may have been missed.
+    """
+    get_listener().subscribe(channel, callback, resync)
+
+def unsubscribe(channel, callback):
+    get_listener().unsubscribe(channel, callback)
+
+def notify(channel, payload=""):
+    """Publish on channel, inside a request it is delivered when the request commits."""
+    execute("SELECT pg_notify(%s, %s)", (channel, payload))
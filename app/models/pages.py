@@ -0,0 +1,150 @@
+# models/pages.py
+from flask import request, session, g, make_response, message_flashed
+from models.cache import TTLCache
+from models.db import get_all, on_commit, use_primary
+from models.notify import subscribe, notify
+from datetime import date
+from functools import wraps
+import hashlib
+import os
+import threading
+
+# part of every ETag, change it on deploys that change templates
+APP_VERSION = os.getenv('APP_VERSION', '')
+
+# roles whose pages do not depend on who is logged in
+PAGE_CACHE_ROLES = {'guest'}
+
+# (page, role, date, path) -> rendered body. Pages are dropped by the writes
+# that change them, in this process on commit and in every other worker
+# through page_invalidate; the TTL only bounds what a missed write costs.
+page_cache = TTLCache(
+    maxsize=int(os.getenv('PAGE_CACHE_SIZE', 1000)),
+    ttl=float(os.getenv('PAGE_CACHE_TTL', 300)),
+    maxbytes=int(os.getenv('PAGE_CACHE_BYTES', 32 * 1024 * 1024))
+)
+_pages_pid = None
+_pages_lock = threading.Lock()
+
+PAGE_INVALIDATE_CHANNEL = "page_invalidate"
+
+# bumped on every invalidation, a page rendered across one is not stored
+_generations = {}
+
+def drop_pages(page):
+    """Drop page from this process's cache only, see invalidate_pages()."""
+    _generations[page] = _generations.get(page, 0) + 1
+    page_cache.pop_matching(lambda key: key[0] == page)
+
+def invalidate_pages(*pages):
+    """Drop pages in every worker once the current request commits."""
+    for page in pages:
+        on_commit(lambda page=page: drop_pages(page))
+        notify(PAGE_INVALIDATE_CHANNEL, page)
+
+def listen_page_invalidate():
+    """Subscribe this process to page invalidations, once per process."""
+    global _pages_pid
+    with _pages_lock:
+        if _pages_pid != os.getpid():
+            # invalidations missed while not listening can't be replayed
+            subscribe(PAGE_INVALIDATE_CHANNEL, drop_pages, resync=page_cache.clear)
+            _pages_pid = os.getpid()
+
+def _on_flash(app, message, category):
+    # a page showing someone's flash messages must not be served to others
+    g.page_flashed = True
+
+message_flashed.connect(_on_flash)
+
+def cached_page(page):
+    """
+    Serve GET requests of PAGE_CACHE_ROLES from page_cache. The key
+    includes the date because pages like the timetable are relative to
+    today.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            role = session.get('role', 'guest')
+            if request.method != 'GET' or role not in PAGE_CACHE_ROLES or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            listen_page_invalidate()
+
+            key = (page, role, date.today().isoformat(), request.full_path)
+            body = page_cache.get(key)
+            if body is not None:
+                return make_response(body)
+
+            generation = _generations.get(page)
+            # invalidations fire when the primary commits, a lagging
+            # replica would put the old page back for PAGE_CACHE_TTL
+            use_primary()
+            response = make_response(view(*args, **kwargs))
+            if (response.status_code == 200 and not response.is_streamed
+                    and not g.get('page_flashed') and _generations.get(page) == generation):
+                page_cache.set(key, response.get_data())
+            return response
+        return wrapper
+    return decorator
+
+def get_table_versions(tables):
+    # read on the primary: a replica only sees sequence values as they
+    # are WAL-logged, in steps of 32 nextval() calls, and the page data
+    # read after them must not be older
+    try:
+        rows = get_all("""
+            SELECT t AS table_name,
+                   coalesce(pg_sequence_last_value((t || '_version_seq')::regclass), 0) AS version
+            FROM unnest(%s::text[]) t
+        """, (list(tables),))
+        return {r["table_name"]: r["version"] for r in rows}
+    except Exception as e:
+        print(f"Error fetching table versions: {e}")
+        return None
+
+def conditional(*tables):
+    """
+    Conditional GET for a view rendered from tables. The ETag combines
+    their change counters with everything the page shows about the
+    session, a matching If-None-Match is answered with 304 before the
+    view runs.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            versions = get_table_versions(tables)
+            if versions is None:
+                return view(*args, **kwargs)
+
+            parts = [
+                APP_VERSION,
+                date.today().isoformat(),
+                request.full_path,
+                session.get('role', 'guest'),
+                session.get('user_id'),
+                session.get('credits'),
+                *(versions.get(t) for t in tables),
+            ]
+            etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+
+            if etag in request.if_none_match:
+                response = make_response("", 304)
+            else:
+                # data from a lagging replica would go out under the new
+                # ETag and then be confirmed by 304s until the next write
+                use_primary()
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or g.get('page_flashed'):
+                    return response
+
+            response.set_etag(etag)
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
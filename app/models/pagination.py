@@ -0,0 +1,27 @@
+# models/pagination.py
+from datetime import datetime
+
+# Keyset pagination cursors: the (created_at, id) of the last row on a
+# page, passed back as "?before=<created_at>,<id>" to get the next one.
+
+def encode_cursor(row):
+    return f"{row['created_at'].isoformat()},{row['id']}"
+
+def decode_cursor(value):
+    if not value:
+        return None
+    try:
+        created_at, row_id = value.rsplit(",", 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        return None
+
+def page_of(rows, limit):
+    """
+    Split limit + 1 fetched rows into the page and the cursor of the next
+    one, None when this is the last page.
+    """
+    if len(rows) <= limit:
+        return {"rows": rows, "next": None}
+    rows = rows[:limit]
+    return {"rows": rows, "next": encode_cursor(rows[-1])}
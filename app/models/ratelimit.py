@@ -0,0 +1,135 @@
+# models/ratelimit.py
+from collections import OrderedDict
+import threading
+import time
+import os
+
+
+def parse_rate(value):
+    """"<requests per second>/<burst>", e.g. "2/10"."""
+    rate, burst = value.split("/")
+    return float(rate), int(burst)
+
+
+class RateLimiter:
+    """
+    Token buckets for many clients, one float per key.
+
+    Each key stores the time at which its bucket will be full again
+    (GCRA). A request is allowed while that time is at most burst - 1
+    intervals ahead of now, and pushes it one interval further. Keys
+    whose bucket is already full carry no information and are dropped
+    first, after that the least recently used ones go once maxkeys is
+    reached, so memory stays bounded however many clients there are.
+    """
+
+    def __init__(self, rate, burst, maxkeys=100000):
+        self.interval = 1.0 / rate
+        self.burst = burst
+        self.maxkeys = maxkeys
+        self._full_at = OrderedDict()
+        self._lock = threading.Lock()
+        self._allowed = 0
+        self._limited = 0
+
+    def hit(self, key):
+        """Returns 0 when the request may go ahead, else the seconds to wait."""
+        now = time.monotonic()
+        with self._lock:
+            full_at = max(self._full_at.get(key, now), now)
+            wait = full_at - now - (self.burst - 1) * self.interval
+            if wait > 0:
+                self._limited += 1
+                return wait
+
+            self._full_at[key] = full_at + self.interval
+            self._full_at.move_to_end(key)
+            self._allowed += 1
+            if len(self._full_at) > self.maxkeys:
+                self._evict(now)
+            return 0
+
+    def _evict(self, now):
+        # oldest first: a full bucket is the same as no entry
+        while self._full_at:
+            key, full_at = next(iter(self._full_at.items()))
+            if full_at > now and len(self._full_at) <= self.maxkeys:
+                break
+            del self._full_at[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "keys": len(self._full_at),
+                "maxkeys": self.maxkeys,
+                "allowed": self._allowed,
+                "limited": self._limited,
+            }
+
+
+class ConcurrencyLimit:
+    """
+    At most limit requests in flight; a request that cannot get a slot
+    within wait seconds is shed instead of queueing on the DB pool.
+    """
+
+    def __init__(self, limit, wait):
+        self.limit = limit
+        self.wait = wait
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._shed = 0
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.wait):
+            with self._lock:
+                self._shed += 1
+            return False
+        with self._lock:
+            self._active += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {"limit": self.limit, "active": self._active, "shed": self._shed}
+
+
+# endpoint -> route class, everything else is "default"
+ROUTE_CLASSES = {
+    'chat.poll_chat': 'poll',
+    'chat.check_active': 'poll',
+    'chat.sync_chat': 'poll',
+    'chat.send_message': 'send',
+    'login.login': 'auth',
+    'register.register': 'auth',
+}
+
+limiters = {
+    name: RateLimiter(*parse_rate(os.getenv(f'RATE_LIMIT_{name.upper()}', default)),
+                      maxkeys=int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000)))
+    for name, default in (
+        ('poll', '2/10'),
+        ('send', '2/10'),
+        ('auth', '1/5'),
+        ('default', '10/30'),
+    )
+}
+
+# requests that use the DB pool at once, long-lived streams are not counted
+admission = ConcurrencyLimit(
+    limit=int(os.getenv('MAX_DB_REQUESTS', int(os.getenv('PGPOOL_MAX', 10)) * 2)),
+    wait=float(os.getenv('ADMISSION_WAIT', 0.1))
+)
+UNLIMITED_ENDPOINTS = {'static', 'chat.stream_chat'}
+
+def get_limit_stats():
+    return {
+        "admission": admission.stats(),
+        "rate": {name: limiter.stats() for name, limiter in limiters.items()},
+    }
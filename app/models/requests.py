@@ -1,54 +1,194 @@
 # models/requests.py
-from models.db import execute, get_one, get_all, get_db_connection
+from models.db import execute, get_one, get_all, get_db_connection, release_db_connection
+from models.users import invalidate_credits
+from models.pagination import page_of
 from datetime import datetime
 import psycopg2
+import threading
+import os
 
-def get_requests():
+REQUESTS_PAGE_SIZE = int(os.getenv('REQUESTS_PAGE_SIZE', 50))
+
+def get_requests_page(before=None, limit=REQUESTS_PAGE_SIZE):
+    """
+    One page of all users' requests, newest first. before is a decoded
+    (created_at, id) cursor, the page starts right after it.
+    """
     try:
-        requests = get_all("""
-            SELECT r.id,
-                   r.amount,
-                   r.created_at,
-                   u.username AS username,
-                   r.user_id
-            FROM requests r
-            JOIN users u ON r.user_id = u.id
-            ORDER BY r.created_at DESC
-        """)
-        return requests
+        if before is None:
+            rows = get_all("""
+                SELECT r.id, r.amount, r.created_at, u.username, r.user_id
+                FROM requests r
+                JOIN users u ON r.user_id = u.id
+                ORDER BY r.created_at DESC, r.id DESC
+                LIMIT %s
+            """, (limit + 1,), readonly=True)
+        else:
+            rows = get_all("""
+                SELECT r.id, r.amount, r.created_at, u.username, r.user_id
+                FROM requests r
+                JOIN users u ON r.user_id = u.id
+                WHERE (r.created_at, r.id) < (%s, %s)
+                ORDER BY r.created_at DESC, r.id DESC
+                LIMIT %s
+            """, (*before, limit + 1), readonly=True)
+        return page_of(rows, limit)
+    except Exception as e:
+        print(f"Error fetching requests: {e}")
+        return "Error fetching requests."
+
+def get_user_requests(user_id, before=None, limit=REQUESTS_PAGE_SIZE):
+    try:
+        if before is None:
+            rows = get_all("""
+                SELECT id, amount, created_at, user_id
+                FROM requests
+                WHERE user_id = %s
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+            """, (user_id, limit + 1), readonly=True)
+        else:
+            rows = get_all("""
+                SELECT id, amount, created_at, user_id
+                FROM requests
+                WHERE user_id = %s AND (created_at, id) < (%s, %s)
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+            """, (user_id, *before, limit + 1), readonly=True)
+        return page_of(rows, limit)
     except Exception as e:
         print(f"Error fetching requests: {e}")
         return "Error fetching requests."
 
-def approve_all():
+APPROVE_BATCH_SIZE = int(os.getenv('APPROVE_BATCH_SIZE', 5000))
+APPROVE_LOCK_ID = 0x4150_5052_4f56   # held by the connection of a running approve-all
+
+# One chunk of approve-all: the deleted rows are exactly the rows that get
+# credited, requests made after the run started (id > max_id) are left
+# for the next run and rows held by a concurrent approve/deny are skipped.
+APPROVE_BATCH = """
+    WITH approved AS (
+        DELETE FROM requests
+        WHERE id IN (
+            SELECT id FROM requests
+            WHERE id <= %(max_id)s
+            ORDER BY id
+            LIMIT %(batch_size)s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING user_id, amount
+    ),
+    credited AS (
+        INSERT INTO credit_ledger (user_id, delta, reason)
+        SELECT user_id, SUM(amount), 'request'
+        FROM approved
+        GROUP BY user_id
+    )
+    SELECT count(*) AS requests, coalesce(SUM(amount), 0) AS credits
+    FROM approved
+"""
+
+def approve_requests(conn, batch_size=APPROVE_BATCH_SIZE, progress=None):
+    """
+    Approve every request that exists when the call starts, batch_size
+    at a time with a commit after each batch, so no transaction holds
+    more than one batch of balance rows. Returns the running totals,
+    progress(totals) is called after every batch.
+    """
+    totals = {"requests": 0, "credits": 0, "batches": 0}
+    with conn.cursor() as cur:
+        cur.execute("SELECT max(id) FROM requests")
+        max_id = cur.fetchone()[0]
+        conn.commit()
+        if max_id is None:
+            return totals
+
+        while True:
+            cur.execute(APPROVE_BATCH, {"max_id": max_id, "batch_size": batch_size})
+            requests, credits = cur.fetchone()
+            conn.commit()
+            if not requests:
+                return totals
+
+            totals["requests"] += requests
+            totals["credits"] += credits
+            totals["batches"] += 1
+            if progress:
+                progress(totals)
+
+def start_approve_all():
+    """
+    Start approving every request on a background thread, its progress
+    is recorded in approve_jobs. Returns None or an error string.
+    """
     conn = None
-    cur = None
     try:
         conn = get_db_connection()
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE users u
-            SET credits = credits + r.total_amount
-            FROM (
-                SELECT user_id, SUM(amount) AS total_amount
-                FROM requests
-                GROUP BY user_id
-            ) r
-            WHERE u.id = r.user_id;
-        """)
-        cur.execute("DELETE FROM requests;")
+        with conn.cursor() as cur:
+            # session-level: released by the run, or by the connection dying
+            cur.execute("SELECT pg_try_advisory_lock(%s)", (APPROVE_LOCK_ID,))
+            if not cur.fetchone()[0]:
+                conn.rollback()
+                release_db_connection(conn)
+                return "An approval is already running."
+            cur.execute("INSERT INTO approve_jobs DEFAULT VALUES RETURNING id")
+            job_id = cur.fetchone()[0]
         conn.commit()
     except Exception as e:
-        print(f"Error approving requests: {e}")
+        print(f"Error starting approval: {e}")
         if conn:
-            conn.rollback()
+            release_db_connection(conn, close=True)
         return "Unknown error while approving requests."
 
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
+    threading.Thread(target=_run_approve_all, args=(conn, job_id), name="approve-all", daemon=True).start()
+    return None
+
+def _run_approve_all(conn, job_id):
+    def progress(t):
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE approve_jobs
+                SET requests = %(requests)s, credits = %(credits)s, batches = %(batches)s
+                WHERE id = %(job_id)s
+            """, {**t, "job_id": job_id})
+        conn.commit()
+        invalidate_credits()
+
+    error = None
+    try:
+        approve_requests(conn, progress=progress)
+    except Exception as e:
+        print(f"Error approving requests: {e}")
+        conn.rollback()
+        error = "Error while approving requests."
+
+    close = False
+    try:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE approve_jobs SET finished_at = now(), error = %s WHERE id = %s", (error, job_id))
+            cur.execute("SELECT pg_advisory_unlock(%s)", (APPROVE_LOCK_ID,))
+        conn.commit()
+    except Exception as e:
+        print(f"Error finishing approval: {e}")
+        # closing the connection is what releases the lock now
+        close = True
+
+    # committed batches changed balances even when a later one failed
+    invalidate_credits()
+    release_db_connection(conn, close=close)
+
+def get_approve_job():
+    """The latest approve-all run, or None if there never was one."""
+    try:
+        return get_one("""
+            SELECT started_at, finished_at, requests, credits, error
+            FROM approve_jobs
+            ORDER BY id DESC
+            LIMIT 1
+        """)
+    except Exception as e:
+        print(f"Error fetching approval status: {e}")
+        return None
 
 def create_request(user_id, amount):
     try:
@@ -78,3 +218,59 @@ def delete_request(request_id):
     except Exception as e:
         print(f"Error deleting request: {e}")
         return "Error deleting request."
+
+# Selected requests are deleted and credited from their stored amounts in
+# one statement. A request another admin already handled is simply not
+# returned, so it can never be credited twice.
+APPROVE_SELECTED = """
+    WITH approved AS (
+        DELETE FROM requests
+        WHERE id = ANY(%s)
+        RETURNING id, user_id, amount
+    ),
+    credited AS (
+        INSERT INTO credit_ledger (user_id, delta, reason)
+        SELECT user_id, SUM(amount), 'request'
+        FROM approved
+        GROUP BY user_id
+    )
+    SELECT a.id, a.amount, u.username
+    FROM approved a
+    JOIN users u ON u.id = a.user_id
+"""
+
+DENY_SELECTED = """
+    DELETE FROM requests
+    WHERE id = ANY(%s)
+    RETURNING id
+"""
+
+def approve_selected(request_ids):
+    """
+    Approve the given requests. Returns {"outcomes": {id: "approved" or
+    "not found"}, "credits": total credited}.
+    """
+    try:
+        rows = get_all(APPROVE_SELECTED, (list(request_ids),))
+        for username in {r["username"] for r in rows}:
+            invalidate_credits(username)
+
+        approved = {r["id"] for r in rows}
+        return {
+            "outcomes": {i: "approved" if i in approved else "not found" for i in request_ids},
+            "credits": sum(r["amount"] for r in rows)
+        }
+    except Exception as e:
+        print(f"Error approving requests: {e}")
+        return "Unknown error while approving requests."
+
+def deny_selected(request_ids):
+    """Deny the given requests. Returns {"outcomes": {id: "denied" or "not found"}}."""
+    try:
+        denied = {r["id"] for r in get_all(DENY_SELECTED, (list(request_ids),))}
+        return {
+            "outcomes": {i: "denied" if i in denied else "not found" for i in request_ids}
+        }
+    except Exception as e:
+        print(f"Error denying requests: {e}")
+        return "Unknown error while denying requests."
@@ -1,20 +1,52 @@
 # models/reviews.py
-from models.db import execute, get_one, get_all
+from models.db import execute, get_one, get_all, get_db_connection, release_db_connection, bump_committed_versions
+from models.pagination import page_of
+from models.pages import invalidate_pages, drop_pages, PAGE_INVALIDATE_CHANNEL
 from datetime import datetime
 import psycopg2
+import os
+
+REVIEWS_PAGE_SIZE = int(os.getenv('REVIEWS_PAGE_SIZE', 20))
+
+def get_reviews_page(before=None, consultant_id=None, rating=None, limit=REVIEWS_PAGE_SIZE):
+    """
+    One page of reviews, newest first, optionally for one consultant
+    and/or one rating. before is a decoded (created_at, id) cursor.
+
+    The page's ids are picked from the index alone, only those rows are
+    then read and joined to users.
+    """
+    conditions = []
+    values = []
+    if consultant_id:
+        conditions.append("consultant_id = %s")
+        values.append(consultant_id)
+    if rating:
+        conditions.append("rating = %s")
+        values.append(rating)
+    if before:
+        conditions.append("(created_at, id) < (%s, %s)")
+        values.extend(before)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
 
-def get_reviews():
     try:
-        reviews = get_all("""
-            SELECT r.id, r.review_text, r.rating, r.created_at,
+        rows = get_all(f"""
+            SELECT r.id, r.review_text, r.rating, r.created_at, r.consultant_id,
                    u.username AS user_name,
                    c.username AS consultant_name
-            FROM reviews r
+            FROM (
+                SELECT id
+                FROM reviews
+                {where}
+                ORDER BY created_at DESC, id DESC
+                LIMIT %s
+            ) page
+            JOIN reviews r ON r.id = page.id
             JOIN users u ON r.user_id = u.id
             JOIN users c ON r.consultant_id = c.id
-            ORDER BY r.created_at DESC
-        """)
-        return reviews
+            ORDER BY r.created_at DESC, r.id DESC
+        """, (*values, limit + 1), readonly=True)
+        return page_of(rows, limit)
     except Exception as e:
         print(f"Error fetching reviews: {e}")
         return "Error fetching reviews."
@@ -23,28 +55,52 @@ def get_popular_consultants(limit=None):
     try:
         query = """
             SELECT
-                c.id AS consultant_id,
+                r.consultant_id,
                 c.username AS consultant_name,
-                COUNT(r.id) AS review_count,
-                ROUND(AVG(r.rating)::numeric, 2) AS average_rating
-            FROM users c
-            JOIN reviews r ON r.consultant_id = c.id
-            WHERE c.role = 'consultant'
-            GROUP BY c.id, c.username
-            HAVING COUNT(r.id) > 0
+                r.review_count,
+                ROUND(r.rating_sum::numeric / r.review_count, 2) AS average_rating,
+                r.histogram
+            FROM consultant_ratings r
+            JOIN users c ON c.id = r.consultant_id
+            WHERE r.review_count > 0
             ORDER BY average_rating DESC, review_count DESC
         """
 
         if limit:
             query += " LIMIT %s"
-            return get_all(query, (limit,))
+            return get_all(query, (limit,), readonly=True)
 
-        return get_all(query)
+        return get_all(query, readonly=True)
 
     except Exception as e:
         print(f"Error fetching popular consultants: {e}")
         return []
 
+def rebuild_consultant_ratings():
+    """Recompute consultant_ratings from reviews, returns the number of consultants."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        with conn.cursor() as cur:
+            cur.execute("SELECT rebuild_consultant_ratings()")
+            rebuilt = cur.fetchone()[0]
+            # sent with this transaction: the CLI has no request whose
+            # commit would carry invalidate_pages() out
+            cur.execute("SELECT pg_notify(%s, 'reviews')", (PAGE_INVALIDATE_CHANNEL,))
+        conn.commit()
+        bump_committed_versions(conn)
+        drop_pages('reviews')
+        return rebuilt
+    except Exception as e:
+        print(f"Error rebuilding consultant ratings: {e}")
+        if conn:
+            conn.rollback()
+        return "Error rebuilding consultant ratings."
+
+    finally:
+        if conn:
+            release_db_connection(conn)
+
 
 def create_review(review_text, rating, user_id, consultant_id):
     """Insert a new review."""
@@ -53,6 +109,7 @@ def create_review(review_text, rating, user_id, consultant_id):
             INSERT INTO reviews (review_text, rating, user_id, consultant_id)
             VALUES (%s, %s, %s, %s)
         """, (review_text, rating, user_id, consultant_id))
+        invalidate_pages('reviews')
         return "Review created successfully."
 
     except psycopg2.errors.UniqueViolation:
@@ -79,6 +136,7 @@ def delete_review(review_id):
             DELETE FROM reviews
             WHERE id = %s
         """, (review_id,))
+        invalidate_pages('reviews')
         return "Review deleted successfully."
 
     except Exception as e:
@@ -1,13 +1,58 @@
 # models/users.py
-from models.db import execute, get_one, get_all, get_db_connection
+from models.db import execute, get_one, get_all, iter_all, on_commit, PreparedStatement
+from models.cache import TTLCache
+from models.pages import invalidate_pages
+from models.notify import subscribe, notify
 from datetime import datetime
 import psycopg2
+import os
+import threading
 
 USER_COLUMN_LENGTHS = {
     "username": [3, 30],
     "password": [3, 60]
 }
 
+USER_CREDITS = PreparedStatement("user_credits", """
+    SELECT coalesce(b.balance, 0) AS credits
+    FROM users u
+    LEFT JOIN credit_balances b ON b.user_id = u.id
+    WHERE u.username = $1
+""")
+
+# raised by a ledger entry that would take a balance below zero
+BALANCE_CHECK = "credit_balances_balance_check"
+
+# username -> credits, dropped by every path that changes credits, in this
+# process on commit and in every other worker through credits_invalidate;
+# the TTL only bounds what a missed notification costs
+credits_cache = TTLCache(
+    maxsize=int(os.getenv('CREDITS_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('CREDITS_CACHE_TTL', 30))
+)
+_credits_pid = None
+_credits_lock = threading.Lock()
+
+def _drop_credits(username):
+    # an empty payload stands for everyone
+    if username:
+        credits_cache.pop(username)
+    else:
+        credits_cache.clear()
+
+def invalidate_credits(username=None):
+    on_commit(lambda: _drop_credits(username))
+    notify("credits_invalidate", username or "")
+
+def listen_credits_invalidate():
+    """Subscribe this process to credit changes, once per process."""
+    global _credits_pid
+    with _credits_lock:
+        if _credits_pid != os.getpid():
+            # changes missed while not listening can't be replayed
+            subscribe("credits_invalidate", _drop_credits, resync=credits_cache.clear)
+            _credits_pid = os.getpid()
+
 def check_length(key, value):
     if USER_COLUMN_LENGTHS[key][0] <= len(value) <= USER_COLUMN_LENGTHS[key][1]:
         return False
@@ -23,15 +68,15 @@ def get_credentials(username):
         print(f"Error occurred while fetching user credentials: {e}")
         return "Error occurred while fetching user credentials."
 
-def get_users():
+def update_password(user_id, hashed_password):
     try:
-        data = get_all("SELECT id, username, email, password, role FROM users ORDER BY id ASC")
-        if data:
-            return data
-        return "No users."
+        execute("UPDATE users SET password = %s WHERE id = %s", (hashed_password, user_id))
     except Exception as e:
-        print(f"Error occurred while fetching users: {e}")
-        return "Error occurred while fetching users."
+        print(f"Error updating password hash: {e}")
+        return "Error updating password."
+
+def iter_users():
+    return iter_all("SELECT id, username, email, password, role FROM users ORDER BY id ASC", readonly=True)
 
 def register_user(username, hashed_password, email, role='user'):
     try:
@@ -40,6 +85,8 @@ def register_user(username, hashed_password, email, role='user'):
             INSERT INTO users (username, password, email, role)
             VALUES (%s, %s, %s, %s)
         """, (username, hashed_password, email, role))
+        if role == 'consultant':
+            invalidate_pages('timetables')
     except psycopg2.errors.UniqueViolation:
         return "Username or email already exists."
 
@@ -54,167 +101,151 @@ def get_consultants():
     try:
         consultants = get_all("""
             SELECT id, username, timetable
-            FROM users
-            WHERE role = 'consultant'
+            FROM consultant_timetables
             ORDER BY username ASC
-        """)
+        """, readonly=True)
         return consultants
     except Exception as e:
         print(f"Error fetching consultants: {e}")
         return "Error fetching consultants."
 
+def get_bookings(user_id):
+    try:
+        return get_all("""
+            SELECT b.slot_date - current_date + 1 AS day, b.slot_date, b.hour,
+                   b.consultant_id, c.username AS consultant_name
+            FROM bookings b
+            JOIN users c ON c.id = b.consultant_id
+            WHERE b.user_id = %s AND b.slot_date >= current_date
+            ORDER BY b.slot_date, b.hour
+        """, (user_id,), readonly=True)
+    except Exception as e:
+        print(f"Error fetching bookings: {e}")
+        return "Error fetching bookings."
+
+# One statement each: check, book and debit (or free and refund) in a
+# single round-trip. The bookings primary key settles races for a slot
+# and the balance CHECK constraint settles races for credits. day is
+# the 1-3 offset of the timetable view, bookings are stored by date.
+RESERVE_SLOT = """
+    WITH consultant AS (
+        SELECT id FROM users WHERE id = %(consultant_id)s AND role = 'consultant'
+    ),
+    usr AS (
+        SELECT u.id, coalesce(b.balance, 0) AS credits
+        FROM users u
+        LEFT JOIN credit_balances b ON b.user_id = u.id
+        WHERE u.username = %(username)s
+    ),
+    booked AS (
+        INSERT INTO bookings (consultant_id, slot_date, hour, user_id)
+        SELECT consultant.id, current_date + %(day)s - 1, %(hour)s, usr.id
+        FROM consultant, usr
+        WHERE usr.credits >= 50
+        ON CONFLICT DO NOTHING
+        RETURNING user_id
+    ),
+    debit AS (
+        INSERT INTO credit_ledger (user_id, delta, reason)
+        SELECT user_id, -50, 'reservation' FROM booked
+        RETURNING id
+    )
+    SELECT EXISTS (SELECT 1 FROM consultant) AS consultant_found,
+           EXISTS (SELECT 1 FROM usr) AS user_found,
+           (SELECT credits FROM usr) AS credits_before,
+           EXISTS (SELECT 1 FROM debit) AS booked
+"""
+
+CANCEL_SLOT = """
+    WITH usr AS (
+        SELECT id FROM users WHERE username = %(username)s
+    ),
+    freed AS (
+        DELETE FROM bookings b
+        USING usr
+        WHERE b.consultant_id = %(consultant_id)s AND b.slot_date = current_date + %(day)s - 1
+          AND b.hour = %(hour)s
+          AND b.user_id = usr.id
+        RETURNING b.user_id
+    ),
+    refund AS (
+        INSERT INTO credit_ledger (user_id, delta, reason)
+        SELECT user_id, 50, 'cancellation' FROM freed
+        RETURNING id
+    )
+    SELECT EXISTS (SELECT 1 FROM users WHERE id = %(consultant_id)s AND role = 'consultant') AS consultant_found,
+           EXISTS (SELECT 1 FROM usr) AS user_found,
+           EXISTS (SELECT 1 FROM refund) AS refunded
+"""
+
 def reserve_slot(consultant_id, username, day, hour):
+    if not 1 <= day <= 3:
+        return "Invalid time slot."
+
+    params = {"consultant_id": consultant_id, "username": username, "day": day, "hour": hour}
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-
-            # Lock consultant row slot
-            cur.execute("""
-                SELECT timetable[%s][%s]
-                FROM users
-                WHERE id = %s AND role = 'consultant'
-                FOR UPDATE
-            """, (day, hour, consultant_id))
-            slot = cur.fetchone()
-
-            if not slot:
-                conn.rollback()
-                return "Consultant not found."
-
-            if slot[0] is not None:
-                conn.rollback()
-                return "This time slot is already reserved."
-
-            # Lock user row for credit update
-            cur.execute("""
-                SELECT id, credits
-                FROM users
-                WHERE username = %s
-                FOR UPDATE
-            """, (username,))
-            user_row = cur.fetchone()
-
-            if not user_row:
-                conn.rollback()
-                return "User not found."
-
-            user_id, credits = user_row
-
-            # Check credits
-            if credits < 50:
-                conn.rollback()
-                return "You do not have enough credits. (50 credits required)"
-
-            # Deduct credits
-            cur.execute("""
-                UPDATE users
-                SET credits = credits - 50
-                WHERE id = %s
-            """, (user_id,))
-
-            # Reserve slot
-            cur.execute("""
-                UPDATE users
-                SET timetable[%s][%s] = %s
-                WHERE id = %s
-            """, (day, hour, user_id, consultant_id))
-
-            conn.commit()
-            return None  # success
+        result = get_one(RESERVE_SLOT, params)
+
+        if not result["consultant_found"]:
+            return "Consultant not found."
+
+        if not result["user_found"]:
+            return "User not found."
+
+        if result["credits_before"] < 50:
+            return "You do not have enough credits. (50 credits required)"
+
+        if not result["booked"]:
+            return "This time slot is already reserved."
+
+        invalidate_credits(username)
+        invalidate_pages('timetables')
+        return None  # success
+
+    except psycopg2.errors.CheckViolation as e:
+        # a concurrent booking spent the credits first
+        if e.diag.constraint_name == BALANCE_CHECK:
+            return "You do not have enough credits. (50 credits required)"
+        return "Invalid time slot."
 
     except psycopg2.Error as e:
         print(f"Database error reserving slot: {e}")
-        if conn:
-            conn.rollback()
         return "Database error while reserving slot."
 
     except Exception as e:
         print(f"Error reserving slot: {e}")
-        if conn:
-            conn.rollback()
         return "Error reserving time slot."
 
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
-
-
 
 def cancel_slot(consultant_id, username, day, hour):
+    if not 1 <= day <= 3:
+        return "Invalid time slot."
+
+    params = {"consultant_id": consultant_id, "username": username, "day": day, "hour": hour}
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cur:
-
-            # Lock consultant slot
-            cur.execute("""
-                SELECT timetable[%s][%s]
-                FROM users
-                WHERE id = %s AND role = 'consultant'
-                FOR UPDATE
-            """, (day, hour, consultant_id))
-            slot = cur.fetchone()
-
-            if not slot:
-                conn.rollback()
-                return "Consultant not found."
-
-            # Get user
-            cur.execute("""
-                SELECT id
-                FROM users
-                WHERE username = %s
-                FOR UPDATE
-            """, (username,))
-            user_row = cur.fetchone()
-
-            if not user_row:
-                conn.rollback()
-                return "User not found."
-
-            user_id = user_row[0]
-
-            # Verify slot belongs to user
-            if slot[0] != user_id:
-                conn.rollback()
-                return "You cannot cancel a slot you do not own."
-
-            # Clear slot
-            cur.execute("""
-                UPDATE users
-                SET timetable[%s][%s] = NULL
-                WHERE id = %s
-            """, (day, hour, consultant_id))
-
-            # Refund credits
-            cur.execute("""
-                UPDATE users
-                SET credits = credits + 50
-                WHERE id = %s
-            """, (user_id,))
-
-            conn.commit()
-            return None  # success
+        result = get_one(CANCEL_SLOT, params)
+
+        if not result["consultant_found"]:
+            return "Consultant not found."
+
+        if not result["user_found"]:
+            return "User not found."
+
+        if not result["refunded"]:
+            return "You cannot cancel a slot you do not own."
+
+        invalidate_credits(username)
+        invalidate_pages('timetables')
+        return None  # success
 
     except psycopg2.Error as e:
         print(f"Database error cancelling slot: {e}")
-        if conn:
-            conn.rollback()
         return "Database error while cancelling reservation."
 
     except Exception as e:
         print(f"Error cancelling slot: {e}")
-        if conn:
-            conn.rollback()
         return "Error cancelling time slot."
 
-    finally:
-        if cur:
-            cur.close()
-        if conn:
-            conn.close()
-
 
 def add_credits(username, amount):
     try:
@@ -226,18 +257,16 @@ def add_credits(username, amount):
         return "Invalid amount value."
 
     try:
-        user = get_one("""
-            SELECT id FROM users WHERE username = %s
-        """, (username,))
+        entry = get_one("""
+            INSERT INTO credit_ledger (user_id, delta, reason)
+            SELECT id, %s, 'top-up' FROM users WHERE username = %s
+            RETURNING id
+        """, (amount, username))
 
-        if not user:
+        if not entry:
             return "User not found."
 
-        execute("""
-            UPDATE users
-            SET credits = credits + %s
-            WHERE id = %s
-        """, (amount, user["id"]))
+        invalidate_credits(username)
 
     except psycopg2.Error as e:
         print(f"PostgreSQL error adding credits: {e}")
@@ -258,24 +287,32 @@ def remove_credits(user_id, amount):
 
     try:
         user = get_one("""
-            SELECT credits
-            FROM users
-            WHERE id = %s
+            SELECT u.username, coalesce(b.balance, 0) AS credits
+            FROM users u
+            LEFT JOIN credit_balances b ON b.user_id = u.id
+            WHERE u.id = %s
         """, (user_id,))
 
         if not user:
             return "User not found."
 
-        current_credits = user[0]
+        current_credits = user["credits"]
 
         if current_credits < amount:
             return f"User only has {current_credits} credits."
 
         execute("""
-            UPDATE users
-            SET credits = credits - %s
-            WHERE id = %s
-        """, (amount, user_id))
+            INSERT INTO credit_ledger (user_id, delta, reason)
+            VALUES (%s, %s, 'removal')
+        """, (user_id, -amount))
+        invalidate_credits(user["username"])
+    except psycopg2.errors.CheckViolation as e:
+        # spent concurrently between the check above and the insert
+        if e.diag.constraint_name == BALANCE_CHECK:
+            return "User does not have enough credits."
+        print(f"PostgreSQL error removing credits: {e}")
+        return "Database error while removing credits."
+
     except psycopg2.Error as e:
         print(f"PostgreSQL error removing credits: {e}")
         return "Database error while removing credits."
@@ -285,9 +322,17 @@ def remove_credits(user_id, amount):
         return "Unknown error while removing credits."
 
 def get_credits(username):
+    cached = credits_cache.get(username)
+    if cached is not None:
+        return cached
+
     try:
-        credits = get_one("SELECT credits FROM users WHERE username = %s", (username,))
+        # from the primary: a lagging replica would cache the balance an
+        # invalidation has just dropped
+        credits = get_one(USER_CREDITS, (username,))
         if credits:
+            listen_credits_invalidate()
+            credits_cache.set(username, credits['credits'])
             return credits['credits']
         return "No such user."
     except Exception as e:
@@ -1,3 +1,8 @@
+-- Development bootstrap: the initial schema plus seed data.
+-- The schema is owned by app/migrations, which brings a database created
+-- from this file up to date on the first app start. Put schema changes
+-- there, not here.
+
 CREATE SCHEMA IF NOT EXISTS smartphonesioi;
 ALTER DATABASE smartphonesioi
     SET search_path = smartphonesioi, public;